@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/aggregations.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Elasticsearch aggregations computing the EC2 usage needed by the analytics
+(see :func:`awsdbrparser.parser.analytics_from_index`) from the line items of
+an already populated index, instead of reading the DBR file again.
+
+The usage is collected in one hourly ``date_histogram`` (at most 744 buckets
+per month) with the cost sums and the Reserved Instance and Spot counts as
+sub-aggregations, which works with both Elasticsearch 2.x and 6.x.
+"""
+from .enrichment import USAGE_ITEM_RULES
+
+DATE_FORMAT = 'yyyy-MM-dd HH:mm:ss'
+
+RESERVED_INSTANCE = 'Reserved Instance'
+SPOT_INSTANCE = 'Spot Instance'
+
+
+def _usage_item_is(usage_item):
+    # match_phrase matches both keyword and (dynamically mapped) text fields
+    return {'match_phrase': {'UsageItem': usage_item}}
+
+
+def hourly_usage_query(config):
+    """
+    Search body aggregating, per hour of the configured month, the running
+    EC2 instances (line items with a ``UsageItem``), their ``Cost`` and
+    ``UnBlendedCost`` and how many of them are Reserved or Spot instances.
+    """
+    year, month = config.es_year, config.es_month
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return {
+        'size': 0,
+        'query': {
+            'bool': {
+                'filter': [
+                    {'range': {'UsageStartDate': {
+                        'gte': '{:04d}-{:02d}-01 00:00:00'.format(year, month),
+                        'lt': '{:04d}-{:02d}-01 00:00:00'.format(next_year, next_month)}}},
+                    {'bool': {'should': [_usage_item_is(usage_item) for _, _, usage_item in USAGE_ITEM_RULES],
+                              'minimum_should_match': 1}},
+                ]
+            }
+        },
+        'aggs': {
+            'hours': {
+                'date_histogram': {'field': 'UsageStartDate', 'interval': 'hour',
+                                   'format': DATE_FORMAT, 'min_doc_count': 1},
+                'aggs': {
+                    'Cost': {'sum': {'field': 'Cost'}},
+                    'Unblended': {'sum': {'field': 'UnBlendedCost'}},
+                    'RI': {'filter': _usage_item_is(RESERVED_INSTANCE)},
+                    'Spot': {'filter': _usage_item_is(SPOT_INSTANCE)},
+                }
+            }
+        }
+    }
+
+
+def hourly_usage(response):
+    """
+    Hourly EC2 usage from the response of a :func:`hourly_usage_query`
+    search, keyed by hour (``'2016-03-01 01:00:00'``).
+
+    :rtype: dict
+    """
+    usage = {}
+    for bucket in response['aggregations']['hours']['buckets']:
+        usage[bucket['key_as_string']] = {
+            'Count': bucket['doc_count'],
+            'Cost': bucket['Cost']['value'] or 0.00,
+            'Unblended': bucket['Unblended']['value'] or 0.00,
+            'RI': bucket['RI']['doc_count'],
+            'Spot': bucket['Spot']['doc_count']}
+    return usage
+
+
+def daily_usage(hourly):
+    """
+    Add up the :func:`hourly_usage` per day (``'2016-03-01'``).
+
+    :rtype: dict
+    """
+    usage = {}
+    for daytime, hour in hourly.items():
+        day = usage.setdefault(daytime.split(' ')[0], {'Count': 0, 'RI': 0, 'Spot': 0, 'Min': None, 'Max': None})
+        day['Count'] += hour['Count']
+        day['RI'] += hour['RI']
+        day['Spot'] += hour['Spot']
+    return usage
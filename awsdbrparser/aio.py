@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/aio.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+asyncio Elasticsearch output (``--async``). The requests (one bulk request
+per batch, or one index request per document in line mode) are sent by a
+single event loop thread over an ``aiohttp`` session, keeping up to
+``Config.es_max_in_flight`` of them in flight. The parser keeps running in
+its own thread and blocks when the window is full, so memory stays bounded
+by the number of requests in flight.
+
+This module requires Python 3 and ``aiohttp`` (``pip install
+awsdbrparser[async]``) and is only imported when the async output is used.
+"""
+import asyncio
+import functools
+import itertools
+import json
+import threading
+
+try:
+    import aiohttp
+except ImportError:
+    raise ImportError('The async Elasticsearch output requires the "aiohttp" package, '
+                      'install it with: pip install awsdbrparser[async]')
+
+from . import encoders
+from . import utils
+from .config import PROCESS_BY_BULK
+from .sinks import Sink, es_index_successful
+from .utils import ParserError
+
+CONTENT_TYPE_JSON = 'application/json'
+CONTENT_TYPE_NDJSON = 'application/x-ndjson'
+
+
+class EventLoop(object):
+    """
+    An asyncio event loop running in a background thread. A sink creates its
+    own by default; ``serve`` keeps one for the async sinks of all its jobs.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='dbrparser-async')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def run(self, coroutine):
+        """
+        Run ``coroutine`` on the loop and wait for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+class AsyncElasticsearchSink(Sink):
+    """
+    Sends the documents to Elasticsearch from an event loop running in a
+    background thread. :meth:`write_many` encodes the batch, schedules its
+    requests on the loop and only blocks while ``es_max_in_flight`` requests
+    are already pending (backpressure). Requests go to the configured hosts
+    in turn and are retried on the next host after a connection error.
+
+    :param auth: optional ``requests`` auth object (e.g. ``AWS4Auth``) used
+        to sign every request (see :func:`awsdbrparser.parser.aws_auth`).
+    :param loop: the :class:`EventLoop` sending the requests, left running
+        at :meth:`close`; when None the sink runs (and closes) its own.
+    """
+
+    encodes = True
+
+    def __init__(self, config, echo=None, auth=None, loop=None):
+        super(AsyncElasticsearchSink, self).__init__()
+        self.config = config
+        self.echo = echo or utils.ClickEchoWrapper(quiet=True)
+        self.auth = auth
+        self.dumps = encoders.encoder_for(config.json_encoder, debug=config.debug)
+        self.failed = 0
+        self._bulk = config.process_mode == PROCESS_BY_BULK
+        action = {'index': {'_index': config.index_name, '_type': config.es_doctype}}
+        self._action = json.dumps(action).encode('utf-8') + b'\n'
+        # like the line sink, line mode indexes into the index named after the document type
+        self._index_path = '/{0}/{0}'.format(config.es_doctype)
+        self._hosts = itertools.cycle(['{}://{}:{}'.format(host.get('scheme', 'http'), host['host'], host['port'])
+                                       for host in config.es_hosts])
+        self._in_flight = max(1, config.es_max_in_flight)
+        self._window = threading.BoundedSemaphore(self._in_flight)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._error = None
+        self._owns_loop = loop is None
+        self._event_loop = EventLoop() if loop is None else loop
+        self._loop = self._event_loop.loop
+        self._session = self._event_loop.run(self._open_session())
+
+    def write_many(self, documents):
+        self._raise_error()
+        if not documents:
+            return
+        dumps = self.dumps
+        if self._bulk:
+            body = b''.join([self._action + dumps(document) + b'\n' for document in documents])
+            self._submit('/_bulk', body, CONTENT_TYPE_NDJSON, len(documents))
+        else:
+            for document in documents:
+                self._submit(self._index_path, dumps(document), CONTENT_TYPE_JSON)
+
+    def flush(self):
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            try:
+                future.result()
+            except Exception:
+                pass  # recorded by _done
+        self._raise_error()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._event_loop.run(self._session.close())
+            if self._owns_loop:
+                self._event_loop.close()
+
+    async def _open_session(self):
+        connector = aiohttp.TCPConnector(limit=self._in_flight)
+        timeout = aiohttp.ClientTimeout(total=self.config.es_timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    def _submit(self, path, body, content_type, documents=1):
+        # blocks the parser while the window is full
+        self._window.acquire()
+        self._raise_error()
+        future = asyncio.run_coroutine_threadsafe(self._send(path, body, content_type), self._loop)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(functools.partial(self._done, documents=documents))
+
+    async def _send(self, path, body, content_type):
+        retries = self.config.es_max_retries
+        for attempt in range(retries + 1):
+            url = next(self._hosts) + path
+            headers = self._sign(url, body, {'Content-Type': content_type})
+            try:
+                async with self._session.post(url, data=body, headers=headers) as response:
+                    return response.status, await response.json(content_type=None)
+            except aiohttp.ClientConnectionError:
+                # timeouts are not retried, the request may have been applied
+                if attempt == retries:
+                    raise
+
+    def _sign(self, url, body, headers):
+        if self.auth is None:
+            return headers
+        import requests
+
+        request = requests.Request('POST', url, data=body, headers=headers).prepare()
+        self.auth(request)
+        return dict(request.headers)
+
+    def _done(self, future, documents):
+        with self._lock:
+            self._pending.discard(future)
+        self._window.release()
+        try:
+            status, result = future.result()
+        except Exception as e:
+            self._fail('Failed to send request to Elasticsearch: {!r}'.format(e), error=e, documents=documents)
+            return
+        if self._bulk:
+            # rejected requests (429, 413, 5xx...) have no items, none of their documents was indexed
+            items = result.get('items', []) if 200 <= status < 300 and isinstance(result, dict) else []
+            for item in items[:documents]:
+                outcome = list(item.values())[0]
+                if 200 <= outcome.get('status', 500) < 300:
+                    self._count()
+                else:
+                    self._fail('Failed to index record with result: {!r}'.format(item))
+            missing = documents - len(items)
+            if missing > 0:
+                self._fail('Failed to index {} record(s), bulk request answered with status {}: {!r}'.format(
+                    missing, status, result), documents=missing)
+        elif 200 <= status < 300 and es_index_successful(result):
+            self._count()
+        else:
+            self._fail('Failed to index record with result {!r}'.format(result))
+
+    def _count(self):
+        with self._lock:
+            self.added += 1
+
+    def _fail(self, message, error=None, documents=1):
+        with self._lock:
+            self.failed += documents
+            if error is not None or self.config.fail_fast:
+                if self._error is None:
+                    self._error = error if error is not None else ParserError(message)
+                return
+        self.echo(message, err=True)
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
@@ -24,38 +24,132 @@ import time
 import click
 
 from . import parser
+from . import loader
+from . import serve as daemon
+from .config import BULK_MAX_BYTES
 from .config import BULK_SIZE
+from .config import COMPRESSION_NONE
+from .config import COMPRESSION_OPTIONS
+from .config import DISTINCT_RESOURCES_ERROR
 from .config import Config
+from .config import ES_MAX_IN_FLIGHT
+from .config import ES_MAX_RETRIES
+from .config import ES_SELECTOR_OPTIONS
+from .config import ES_SELECTOR_ROUND_ROBIN
 from .config import ES_TIMEOUT
+from .config import JSON_ENCODER_AUTO
+from .config import JSON_ENCODER_OPTIONS
+from .config import LOAD_CONCURRENCY
+from .config import MAX_OPEN_PARTITIONS
+from .config import OUTPUT_BUFFER_SIZE
 from .config import OUTPUT_OPTIONS
 from .config import OUTPUT_TO_FILE
+from .config import PARQUET_COMPRESSION
+from .config import PARQUET_COMPRESSION_OPTIONS
+from .config import PARQUET_ROW_GROUP_SIZE
+from .config import PROCESS_BI_ONLY
 from .config import PROCESS_BY_LINE
 from .config import PROCESS_OPTIONS
+from .config import S3_CONCURRENCY
+from .config import S3_PART_SIZE
+from .config import STATUS_INTERVAL
+from .config import TOP_RESOURCES
+from .config import TOP_RESOURCES_ERROR
 from .config import DEFAULT_ES2
+from .s3 import is_s3_url
 from .utils import ClickEchoWrapper
 from .utils import display_banner
 from .utils import hints_for
+from .utils import parse_hosts
 from .utils import values_of
 
 configure = click.make_pass_decorator(Config, ensure=True)
 
 
-@click.command()
-@click.option('-i', '--input', metavar='FILE', help='Input file (expected to be a CSV file).')
-@click.option('-o', '--output', metavar='FILE', help='Output file (will generate a JSON file).')
-@click.option('-e', '--es-host', metavar='HOST', help='Elasticsearch host name or IP address.')
+@click.group(invoke_without_command=True)
+@click.option('-i', '--input', metavar='FILE', help='Input file (expected to be a CSV file, local or s3://bucket/key).')
+@click.option('-o', '--output', metavar='FILE', help='Output file (will generate a JSON or Parquet file).')
+@click.option('-e', '--es-host', metavar='HOST', help='Elasticsearch host name or IP address (a comma separated '
+                                                      'HOST[:PORT] list spreads the requests over several nodes).')
 @click.option('-p', '--es-port', type=int, metavar='PORT', help='Elasticsearch port number.')
 @click.option('-to', '--es-timeout', type=int, default=ES_TIMEOUT, metavar='TIMEOUT',
               help='Elasticsearch connection Timeout.')
+@click.option('--es-selector', default=ES_SELECTOR_ROUND_ROBIN,
+              type=click.Choice(values_of(ES_SELECTOR_OPTIONS)),
+              help='Elasticsearch node chosen for each request ({}, default is {}).'.format(
+                  hints_for(ES_SELECTOR_OPTIONS), ES_SELECTOR_ROUND_ROBIN))
+@click.option('--es-retries', 'es_max_retries', type=int, default=ES_MAX_RETRIES, metavar='N',
+              help='Retries on another Elasticsearch node after a connection error.')
+@click.option('--async', 'es_async', is_flag=True, default=False,
+              help='Send the Elasticsearch requests from an asyncio event loop (Python 3, requires aiohttp).')
+@click.option('--in-flight', 'es_max_in_flight', type=int, default=ES_MAX_IN_FLIGHT, metavar='N',
+              help='Elasticsearch requests kept in flight with --async; parsing waits when the window is full.')
+@click.option('--bulk-load', 'es_bulk_load', is_flag=True, default=False,
+              help='Disable refresh and replicas on the target indices during the load and restore them after.')
+@click.option('--force-merge', 'es_force_merge', is_flag=True, default=False,
+              help='With --bulk-load, force merge the indices after a successful load.')
+@click.option('--sniff', 'es_sniff', is_flag=True, default=False,
+              help='Discover the Elasticsearch nodes from the given hosts (self-managed clusters only).')
 @click.option('-ei', '--es-index', metavar='INDEX', help='Elasticsearch index prefix.')
 @click.option('-bi', '--analytics', is_flag=True, default=False,
               help='Execute analytics on file to generate extra-information')
+@click.option('--from-index', 'analytics_from_index', is_flag=True, default=False,
+              help='With --process-mode 3, compute the analytics from the line items already indexed in '
+                   'Elasticsearch (no input file needed).')
+@click.option('--top-resources', 'analytics_top_resources', type=int, default=TOP_RESOURCES, metavar='N',
+              help='Most expensive resources per day reported by the analytics (0 disables them).')
+@click.option('--top-resources-error', 'analytics_top_error', type=float, default=TOP_RESOURCES_ERROR,
+              metavar='FRACTION', help='Maximum error of the top resources costs, as a fraction of the day cost.')
+@click.option('--distinct-error', 'analytics_distinct_error', type=float, default=DISTINCT_RESOURCES_ERROR,
+              metavar='FRACTION', help='Relative error of the distinct resources per product and day.')
+@click.option('--analytics-state', type=click.Path(dir_okay=False), metavar='FILE',
+              help='Keep the analytics state per account and month in FILE, so later runs over the month-to-date '
+                   'DBR only process the new line items.')
 @click.option('-a', '--account-id', help='AWS Account-ID.')
 @click.option('-y', '--year', type=int, help='Year for the index (defaults to current year).')
 @click.option('-m', '--month', type=int, help='Month for the index (defaults to current month).')
 @click.option('-t', '--output-type', default=OUTPUT_TO_FILE,
               type=click.Choice(values_of(OUTPUT_OPTIONS)),
               help='Output type ({}, default is {}).'.format(hints_for(OUTPUT_OPTIONS), OUTPUT_TO_FILE))
+@click.option('-z', '--compression', 'output_compression', default=COMPRESSION_NONE,
+              type=click.Choice(values_of(COMPRESSION_OPTIONS)),
+              help='Output file compression ({}, default is {}).'.format(
+                  hints_for(COMPRESSION_OPTIONS), COMPRESSION_NONE))
+@click.option('--buffer-size', 'output_buffer_size', type=int, default=OUTPUT_BUFFER_SIZE, metavar='BYTES',
+              help='Output file write buffer size in bytes.')
+@click.option('--shard-size', 'shard_max_bytes', type=int, metavar='BYTES',
+              help='Roll output into part-NNNNN.json shards of at most BYTES (uncompressed) '
+                   'inside the --output directory.')
+@click.option('--shard-rows', 'shard_max_rows', type=int, metavar='ROWS',
+              help='Roll output into part-NNNNN.json shards of at most ROWS documents '
+                   'inside the --output directory.')
+@click.option('--json-encoder', default=JSON_ENCODER_AUTO,
+              type=click.Choice(values_of(JSON_ENCODER_OPTIONS)),
+              help='JSON encoder for the JSON outputs and Elasticsearch ({}, default is {}).'.format(
+                  hints_for(JSON_ENCODER_OPTIONS), JSON_ENCODER_AUTO))
+@click.option('--writer-thread', is_flag=True, default=False,
+              help='Encode, compress and write the output file in a background thread.')
+@click.option('--partition-by', metavar='COLUMN',
+              help='Write Hive partitioned directories dt=YYYY-MM-DD/<COLUMN>=<value>/ inside the --output '
+                   'directory (e.g. LinkedAccountId, written as account=<id>).')
+@click.option('--max-open-partitions', type=click.IntRange(1, None), default=MAX_OPEN_PARTITIONS, metavar='N',
+              help='Maximum number of partition files kept open at once (see --partition-by).')
+@click.option('--row-group-size', 'parquet_row_group_size', type=int, default=PARQUET_ROW_GROUP_SIZE,
+              metavar='ROWS', help='Rows per Parquet row group (bounds memory usage of Parquet output).')
+@click.option('--parquet-compression', default=PARQUET_COMPRESSION,
+              type=click.Choice(values_of(PARQUET_COMPRESSION_OPTIONS)),
+              help='Parquet column compression ({}, default is {}).'.format(
+                  hints_for(PARQUET_COMPRESSION_OPTIONS), PARQUET_COMPRESSION))
+@click.option('--bulk-file-size', 'bulk_max_bytes', type=int, default=BULK_MAX_BYTES, metavar='BYTES',
+              help='Maximum size of each Elasticsearch bulk file (see --bulk-size for the number of documents).')
+@click.option('--id-field', 'es_id_field', metavar='COLUMN',
+              help='Column used as document _id in Elasticsearch bulk files (e.g. RecordId).')
+@click.option('--s3-part-size', type=int, default=S3_PART_SIZE, metavar='BYTES',
+              help='Size of each ranged GET when streaming the input from S3.')
+@click.option('--s3-concurrency', type=int, default=S3_CONCURRENCY, metavar='N',
+              help='Concurrent ranged GETs when streaming the input from S3.')
+@click.option('--s3-endpoint-url', metavar='URL',
+              help='Custom S3 endpoint (e.g. a MinIO server).')
 @click.option('-d', '--csv-delimiter', help='CSV delimiter (default is comma).')
 @click.option('--delete-index', is_flag=True, default=False,
               help='Delete current index before processing (default is keep).')
@@ -77,15 +171,23 @@ configure = click.make_pass_decorator(Config, ensure=True)
 @click.option('-q', '--quiet', is_flag=True, default=False, help='Runs as silently as possible.')
 @click.option('--fail-fast', is_flag=True, default=False, help='Stop parsing on first index error.')
 @click.option('--debug', is_flag=True, default=False, help='Print extra data even in quiet mode.')
+@click.option('--status-file', type=click.Path(dir_okay=False), metavar='FILE',
+              help='Write the parsing progress (rows/s, MB/s, acknowledged documents, ETA) as JSON to FILE.')
+@click.option('--status-interval', type=float, default=STATUS_INTERVAL, metavar='SECONDS',
+              help='Seconds between two updates of the --status-file.')
 @configure
 def main(config, *args, **kwargs):
     """AWS - Detailed Billing Records parser"""
 
+    subcommand = click.get_current_context().invoked_subcommand
+
     quiet = kwargs.pop('quiet')
     version = kwargs.pop('version')
 
     echo = ClickEchoWrapper(quiet=quiet)
-    display_banner(echo=echo)
+    if not subcommand:
+        # subcommands display the banner themselves
+        display_banner(echo=echo)
 
     if version:
         return
@@ -99,7 +201,12 @@ def main(config, *args, **kwargs):
 
     config.update_from(**kwargs)
 
-    if not os.path.isfile(config.input_filename):
+    if subcommand:
+        # the options above are the defaults for the subcommand (e.g. serve)
+        return
+
+    from_index = config.analytics_from_index and config.process_mode == PROCESS_BI_ONLY
+    if not from_index and not is_s3_url(config.input_filename) and not os.path.isfile(config.input_filename):
         sys.exit('Input file not found: {}'.format(config.input_filename))
 
     start = time.time()
@@ -107,3 +214,85 @@ def main(config, *args, **kwargs):
 
     elapsed_time = time.time() - start
     echo('Elapsed time: {}'.format(datetime.timedelta(seconds=elapsed_time)))
+
+
+@main.command()
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('-e', '--es-host', 'clusters', multiple=True, required=True, metavar='HOST[:PORT][,...]',
+              help='Elasticsearch cluster to load into, as one or more comma separated nodes (repeat to '
+                   'load the same files into several clusters).')
+@click.option('-p', '--es-port', type=int, default=80, metavar='PORT',
+              help='Elasticsearch port number for hosts given without one.')
+@click.option('-to', '--es-timeout', type=int, default=ES_TIMEOUT, metavar='TIMEOUT',
+              help='Elasticsearch connection Timeout.')
+@click.option('-c', '--concurrency', type=int, default=LOAD_CONCURRENCY, metavar='N',
+              help='Concurrent bulk requests per cluster.')
+@click.option('--delete-index', is_flag=True, default=False,
+              help='Delete current index before loading (default is keep).')
+@click.option('--awsauth', is_flag=True, default=False,
+              help='Access the Elasticsearch with AWS Signed V4 Requests')
+@click.option('-q', '--quiet', is_flag=True, default=False, help='Runs as silently as possible.')
+@click.option('--fail-fast', is_flag=True, default=False, help='Stop loading on first index error.')
+@configure
+def load(config, paths, clusters, es_port, concurrency, delete_index, quiet, **kwargs):
+    """Send Elasticsearch bulk files (output type 4) to one or more clusters"""
+
+    echo = ClickEchoWrapper(quiet=quiet)
+    display_banner(echo=echo)
+
+    config.update_from(**kwargs)
+
+    clients = []
+    for cluster in clusters:
+        es = parser.elasticsearch_client(config, hosts=parse_hosts(cluster, es_port))
+        loader.prepare_index(es, paths, delete_index=delete_index, echo=echo)
+        clients.append(es)
+
+    start = time.time()
+    summary = loader.load(config, clients, paths, concurrency, verbose=(not quiet))
+
+    echo('Finished loading!')
+    echo('')
+    echo('Summary of documents loaded...')
+    echo('   Bulk requests: {}'.format(summary.requests))
+    echo('           Added: {}'.format(summary.added))
+    echo('          Failed: {}'.format(summary.failed))
+    echo('')
+
+    elapsed_time = time.time() - start
+    echo('Elapsed time: {}'.format(datetime.timedelta(seconds=elapsed_time)))
+
+
+@main.command()
+@click.argument('locations', nargs=-1, required=True, metavar='DIR|s3://BUCKET/PREFIX...')
+@click.option('-od', '--output-dir', type=click.Path(file_okay=False), default='.',
+              help='Directory for the file outputs (one output per DBR file, default is current directory).')
+@click.option('-c', '--concurrency', type=int, default=daemon.SERVE_CONCURRENCY, metavar='N',
+              help='Number of DBR files processed at the same time.')
+@click.option('--interval', type=int, default=daemon.WATCH_INTERVAL, metavar='SECONDS',
+              help='Seconds between scans of the watched locations.')
+@click.option('--state-file', type=click.Path(dir_okay=False), metavar='FILE',
+              help='Remember the content hash of processed files across restarts.')
+@click.option('--once', is_flag=True, default=False, help='Process a single scan and exit.')
+@click.option('-q', '--quiet', is_flag=True, default=False, help='Runs as silently as possible.')
+@configure
+def serve(config, locations, output_dir, concurrency, interval, state_file, once, quiet):
+    """Watch directories or S3 prefixes and parse new or updated DBR files.
+
+    Parsing options (output type, Elasticsearch host, --analytics, ...) are
+    given before the command, e.g.: dbrparser -t 2 -e HOST --es6 serve /mnt/jobs
+    """
+
+    echo = ClickEchoWrapper(quiet=quiet)
+    display_banner(echo=echo)
+
+    for location in locations:
+        if not is_s3_url(location) and not os.path.isdir(location):
+            sys.exit('Directory not found: {}'.format(location))
+
+    echo('Watching {} every {}s with {} worker(s)'.format(', '.join(locations), interval, concurrency))
+    try:
+        daemon.serve(config, locations, concurrency=concurrency, interval=interval, state_file=state_file,
+                     once=once, verbose=(not quiet), output_dir=output_dir)
+    except KeyboardInterrupt:
+        echo('Stopped.')
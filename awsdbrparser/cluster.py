@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/cluster.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Client side load balancing over several Elasticsearch nodes. The client keeps
+one connection per node (given with ``-e node-1,node-2`` or discovered by
+sniffing) and picks one per request, so bulk requests are spread over the
+coordinating nodes instead of all landing on the first one. Nodes failing
+with connection errors are marked dead by the client connection pool and the
+request is retried on another node.
+
+This module imports ``elasticsearch`` and is only imported when a client is
+built (see :func:`awsdbrparser.parser.elasticsearch_client`).
+"""
+import itertools
+import threading
+
+from elasticsearch import RequestsHttpConnection
+from elasticsearch.connection_pool import ConnectionSelector, RoundRobinSelector
+
+from .config import ES_SELECTOR_LEAST_LOADED, ES_SELECTOR_ROUND_ROBIN
+
+
+class TrackedConnection(RequestsHttpConnection):
+    """
+    Connection keeping the number of requests currently in flight on its
+    node, used by :class:`LeastLoadedSelector`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TrackedConnection, self).__init__(*args, **kwargs)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def perform_request(self, *args, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return super(TrackedConnection, self).perform_request(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class LeastLoadedSelector(ConnectionSelector):
+    """
+    Select the live connection with the fewest requests in flight. Ties are
+    broken in round-robin order, so a single threaded client still spreads
+    its requests over all the nodes.
+    """
+
+    def __init__(self, opts):
+        super(LeastLoadedSelector, self).__init__(opts)
+        self._counter = itertools.count()
+
+    def select(self, connections):
+        start = next(self._counter) % len(connections)
+        rotated = connections[start:] + connections[:start]
+        return min(rotated, key=lambda connection: getattr(connection, 'in_flight', 0))
+
+
+SELECTORS = {
+    ES_SELECTOR_ROUND_ROBIN: RoundRobinSelector,
+    ES_SELECTOR_LEAST_LOADED: LeastLoadedSelector,
+}
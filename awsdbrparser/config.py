@@ -22,12 +22,24 @@ import json
 
 from datetime import datetime
 
+from . import utils
+
 OUTPUT_TO_FILE = '1'
 OUTPUT_TO_ELASTICSEARCH = '2'
+OUTPUT_TO_PARQUET = '3'
+OUTPUT_TO_BULK_FILES = '4'
 
 OUTPUT_OPTIONS = (
     (OUTPUT_TO_FILE, 'Output to File'),
-    (OUTPUT_TO_ELASTICSEARCH, 'Output to Elasticsearch'),)
+    (OUTPUT_TO_ELASTICSEARCH, 'Output to Elasticsearch'),
+    (OUTPUT_TO_PARQUET, 'Output to Parquet File'),
+    (OUTPUT_TO_BULK_FILES, 'Output to Elasticsearch Bulk Files'),)
+
+OUTPUT_EXTENSIONS = {
+    OUTPUT_TO_FILE: '.json',
+    OUTPUT_TO_PARQUET: '.parquet',
+    OUTPUT_TO_BULK_FILES: '-bulk',
+}
 
 PROCESS_BY_LINE = '1'
 PROCESS_BY_BULK = '2'
@@ -38,8 +50,59 @@ PROCESS_OPTIONS = (
     (PROCESS_BY_BULK, 'Process in Bulk'),
     (PROCESS_BI_ONLY, 'Process BI Only'))
 
+COMPRESSION_NONE = 'none'
+COMPRESSION_GZIP = 'gzip'
+COMPRESSION_ZSTD = 'zstd'
+
+COMPRESSION_OPTIONS = (
+    (COMPRESSION_NONE, 'No compression'),
+    (COMPRESSION_GZIP, 'gzip'),
+    (COMPRESSION_ZSTD, 'Zstandard'))
+
+JSON_ENCODER_AUTO = 'auto'
+JSON_ENCODER_ORJSON = 'orjson'
+JSON_ENCODER_UJSON = 'ujson'
+JSON_ENCODER_JSON = 'json'
+
+JSON_ENCODER_OPTIONS = (
+    (JSON_ENCODER_AUTO, 'Fastest installed'),
+    (JSON_ENCODER_ORJSON, 'orjson'),
+    (JSON_ENCODER_UJSON, 'ujson'),
+    (JSON_ENCODER_JSON, 'Standard library'))
+
 BULK_SIZE = 1000
+BULK_MAX_BYTES = 10 * 1024 * 1024
+LOAD_CONCURRENCY = 4
+
+S3_PART_SIZE = 8 * 1024 * 1024
+S3_CONCURRENCY = 4
 ES_TIMEOUT = 30
+ES_MAX_RETRIES = 3
+ES_MAX_IN_FLIGHT = 16
+ES_SNIFF_INTERVAL = 60
+STATUS_INTERVAL = 10
+
+ES_SELECTOR_ROUND_ROBIN = 'round-robin'
+ES_SELECTOR_LEAST_LOADED = 'least-loaded'
+
+ES_SELECTOR_OPTIONS = (
+    (ES_SELECTOR_ROUND_ROBIN, 'Round robin'),
+    (ES_SELECTOR_LEAST_LOADED, 'Fewest requests in flight'))
+
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+MAX_OPEN_PARTITIONS = 64
+
+TOP_RESOURCES = 100
+TOP_RESOURCES_ERROR = 0.001
+DISTINCT_RESOURCES_ERROR = 0.02
+
+PARQUET_ROW_GROUP_SIZE = 100000
+PARQUET_COMPRESSION_OPTIONS = (
+    ('snappy', 'Snappy'),
+    ('gzip', 'gzip'),
+    ('zstd', 'Zstandard'),
+    ('none', 'No compression'))
+PARQUET_COMPRESSION = 'snappy'
 
 DEFAULT_ES2 = True
 DATA_PATH = 'data'
@@ -68,6 +131,23 @@ class Config(object):
         self.es_timestamp = 'UsageStartDate'  # fieldname that will be replaced by Timestamp
         self.es_timeout = ES_TIMEOUT
 
+        # several nodes (es_host as a comma separated HOST[:PORT] list): node
+        # selection per request, retries on another node after a connection
+        # error and sniffing of the cluster nodes (self-managed clusters only)
+        self._es_selector = ES_SELECTOR_ROUND_ROBIN
+        self.es_max_retries = ES_MAX_RETRIES
+        self.es_sniff = False
+
+        # bulk-load mode: disable refresh and replicas on the target indices
+        # during the load, restore them afterwards and optionally force merge
+        self.es_bulk_load = False
+        self.es_force_merge = False
+
+        # send the Elasticsearch requests from an asyncio event loop (Python 3,
+        # requires aiohttp) with up to es_max_in_flight requests in flight
+        self.es_async = False
+        self.es_max_in_flight = ES_MAX_IN_FLIGHT
+
         # aws account id
         self.account_id = '01234567890'
 
@@ -90,22 +170,51 @@ class Config(object):
         # Run Business Intelligence on the line items
         self.analytics = False
 
+        # Most expensive resources reported per day (0 disables them) and the
+        # error bounds of the sketches summarizing the resources: top costs are
+        # within top_error times the day cost, distinct resources per product
+        # within distinct_error relative error
+        self.analytics_top_resources = TOP_RESOURCES
+        self.analytics_top_error = TOP_RESOURCES_ERROR
+        self.analytics_distinct_error = DISTINCT_RESOURCES_ERROR
+
+        # local file keeping the analytics state per account and month, so a
+        # later run over the month-to-date DBR only processes the new rows
+        self.analytics_state = None
+
         # Time to wait for the analytics process. Default is 30 minutes
         self.analytics_timeout = 30
 
         # Run Business Intelligence Only
         self.bi_only = False
 
+        # Business Intelligence Only mode computes the analytics with
+        # aggregations over the line items already indexed in Elasticsearch
+        # instead of reading the input file
+        self.analytics_from_index = False
+
         # delete index flag indicates whether or not the current elasticsearch
         # should be kept or deleted
         self.delete_index = False
 
+        # JSON file rewritten every status_interval seconds with the parsing
+        # progress (see awsdbrparser.progress), for job monitors
+        self.status_file = None
+        self.status_interval = STATUS_INTERVAL
+
         # debug flag (will force print some extra data even in quiet mode)
         self.debug = False
 
         # fail fast flag (if True stop parsing on first index error)
         self.fail_fast = False
 
+        # S3 input (-i s3://bucket/key): ranged GET size, parallel requests,
+        # parts buffered ahead of the parser and custom endpoint (e.g. MinIO)
+        self.s3_part_size = S3_PART_SIZE
+        self.s3_concurrency = S3_CONCURRENCY
+        self.s3_read_ahead = 2 * S3_CONCURRENCY
+        self.s3_endpoint_url = None
+
         # input and output filenames
         self._input_filename = None
         self._output_filename = None
@@ -115,6 +224,33 @@ class Config(object):
         self._output_type = OUTPUT_TO_FILE
         self._bulk_mode = PROCESS_BY_LINE
         self.bulk_size = BULK_SIZE
+
+        # bulk files output: upper size of each request file (see also bulk_size)
+        # and the column used as document _id (None lets Elasticsearch generate it)
+        self.bulk_max_bytes = BULK_MAX_BYTES
+        self.es_id_field = None
+
+        # file output: write buffer, streaming compression and sharding
+        # (shards are rolled when either limit is reached; None means unbounded)
+        self._output_compression = COMPRESSION_NONE
+        self.output_buffer_size = OUTPUT_BUFFER_SIZE
+        self.shard_max_bytes = None
+        self.shard_max_rows = None
+
+        # JSON encoder used for file, bulk file and Elasticsearch outputs
+        self._json_encoder = JSON_ENCODER_AUTO
+
+        # encode and write the output file in a background thread
+        self.writer_thread = False
+
+        # Hive style partitioned file output (dt=<day>/<column>=<value>/); the
+        # column is the second partition level, None writes a single output
+        self.partition_by = None
+        self.max_open_partitions = MAX_OPEN_PARTITIONS
+
+        # Parquet output: rows buffered per row group and column compression
+        self.parquet_row_group_size = PARQUET_ROW_GROUP_SIZE
+        self.parquet_compression = PARQUET_COMPRESSION
         self.bulk_msg = {
             "RecordType": [
                 "StatementTotal",
@@ -138,6 +274,20 @@ class Config(object):
             raise ValueError('Invalid output type value: {!r}'.format(value))
         self._output_type = value
 
+    @property
+    def es_hosts(self):
+        return utils.parse_hosts(self.es_host, self.es_port)
+
+    @property
+    def es_selector(self):
+        return self._es_selector
+
+    @es_selector.setter
+    def es_selector(self, value):
+        if value not in (v for v, s in ES_SELECTOR_OPTIONS):
+            raise ValueError('Invalid Elasticsearch selector value: {!r}'.format(value))
+        self._es_selector = value
+
     @property
     def output_to_file(self):
         return self.output_type == OUTPUT_TO_FILE
@@ -146,6 +296,34 @@ class Config(object):
     def output_to_elasticsearch(self):
         return self.output_type == OUTPUT_TO_ELASTICSEARCH
 
+    @property
+    def output_to_parquet(self):
+        return self.output_type == OUTPUT_TO_PARQUET
+
+    @property
+    def output_to_bulk_files(self):
+        return self.output_type == OUTPUT_TO_BULK_FILES
+
+    @property
+    def output_compression(self):
+        return self._output_compression
+
+    @output_compression.setter
+    def output_compression(self, value):
+        if value not in (v for v, s in COMPRESSION_OPTIONS):
+            raise ValueError('Invalid output compression value: {!r}'.format(value))
+        self._output_compression = value
+
+    @property
+    def json_encoder(self):
+        return self._json_encoder
+
+    @json_encoder.setter
+    def json_encoder(self, value):
+        if value not in (v for v, s in JSON_ENCODER_OPTIONS):
+            raise ValueError('Invalid JSON encoder value: {!r}'.format(value))
+        self._json_encoder = value
+
     @property
     def process_mode(self):
         return self._bulk_mode
@@ -166,7 +344,7 @@ class Config(object):
 
     @property
     def output_filename(self):
-        return self._output_filename or self._sugest_filename('.json')
+        return self._output_filename or self._sugest_filename(OUTPUT_EXTENSIONS.get(self.output_type, '.json'))
 
 
     @property
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/encoders.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+JSON encoders turning documents into UTF-8 bytes, the form in which they are
+written to files and Elasticsearch bulk bodies. ``orjson`` and ``ujson`` are
+much faster than the standard library ``json`` module and are used when
+installed (``pip install awsdbrparser[orjson]``).
+"""
+from __future__ import print_function
+
+import json
+
+from .config import JSON_ENCODER_AUTO, JSON_ENCODER_JSON, JSON_ENCODER_ORJSON, JSON_ENCODER_UJSON
+
+
+def _orjson():
+    import orjson
+
+    return orjson.dumps
+
+
+def _ujson():
+    import ujson
+
+    def dumps(document):
+        return _utf8(ujson.dumps(document, ensure_ascii=False, escape_forward_slashes=False))
+    return dumps
+
+
+def _json():
+    def dumps(document):
+        return _utf8(json.dumps(document, ensure_ascii=False))
+    return dumps
+
+
+def _utf8(data):
+    # on Python 2 the documents of byte string rows are dumped as UTF-8 bytes already
+    return data if isinstance(data, bytes) else data.encode('utf-8')
+
+
+BACKENDS = (
+    (JSON_ENCODER_ORJSON, _orjson),
+    (JSON_ENCODER_UJSON, _ujson),
+    (JSON_ENCODER_JSON, _json),
+)
+"""
+Encoder backends in the order they are tried by ``auto``.
+"""
+
+
+def encoder_for(name, debug=False):
+    """
+    Return a function encoding a document as UTF-8 JSON bytes (non ASCII
+    characters are not escaped) with the named backend, or the fastest one
+    installed for ``auto``. With ``debug`` every encoded document is printed
+    as well, so documents are encoded only once even when debugging.
+
+    :raises ImportError: when the named backend is not installed.
+    """
+    dumps = None
+    for backend, factory in BACKENDS:
+        if name == backend:
+            try:
+                dumps = factory()
+            except ImportError:
+                raise ImportError('The {0} JSON encoder requires the {0} package, install it with: '
+                                  'pip install awsdbrparser[{0}]'.format(backend))
+            break
+        elif name == JSON_ENCODER_AUTO:
+            try:
+                dumps = factory()
+                break
+            except ImportError:
+                continue
+    if dumps is None:
+        raise ValueError('Invalid JSON encoder: {!r}'.format(name))
+    if debug:
+        return _printing(dumps)
+    return dumps
+
+
+def _printing(dumps):
+    def dumps_and_print(document):
+        data = dumps(document)
+        print(data.decode('utf-8'))  # do not use 'echo()' here
+        return data
+    return dumps_and_print
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/enrichment.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Rule based classification of DBR line items. The derived fields depend only
+on ``ProductName``, ``Operation``, ``UsageType`` and ``ReservedInstance``,
+which have a few thousand distinct combinations per month against millions of
+line items, so the classification is computed once per combination and cached.
+"""
+import re
+
+try:
+    from functools import lru_cache
+except ImportError:  # Python 2
+    def lru_cache(maxsize=128):
+        def decorator(function):
+            cache = {}
+
+            def wrapper(*args):
+                try:
+                    return cache[args]
+                except KeyError:
+                    if len(cache) >= maxsize:
+                        cache.clear()
+                    result = cache[args] = function(*args)
+                    return result
+            wrapper.cache_clear = cache.clear
+            return wrapper
+        return decorator
+
+CACHE_SIZE = 8192
+
+EC2_PRODUCT = 'Amazon Elastic Compute Cloud'
+EC2_RUN_OPERATION = 'RunInstances'  # some line items contain strings like "RunInstances:002"
+
+USAGE_ITEM_RULES = (
+    # (field, test, UsageItem) -- the first matching rule wins
+    ('ReservedInstance', lambda value: value == 'Y', 'Reserved Instance'),
+    ('UsageType', lambda value: 'BoxUsage' in value, 'On-Demand'),
+    ('UsageType', lambda value: 'SpotUsage' in value, 'Spot Instance'),
+)
+"""
+Rules evaluated for running EC2 instances to fill the ``UsageItem`` field.
+"""
+
+REGION_CODES = {
+    'USE1': 'us-east-1',
+    'USE2': 'us-east-2',
+    'USW1': 'us-west-1',
+    'USW2': 'us-west-2',
+    'UGW1': 'us-gov-west-1',
+    'UGE1': 'us-gov-east-1',
+    'CAN1': 'ca-central-1',
+    'SAE1': 'sa-east-1',
+    'EU': 'eu-west-1',
+    'EUW2': 'eu-west-2',
+    'EUW3': 'eu-west-3',
+    'EUC1': 'eu-central-1',
+    'EUN1': 'eu-north-1',
+    'EUS1': 'eu-south-1',
+    'APN1': 'ap-northeast-1',
+    'APN2': 'ap-northeast-2',
+    'APN3': 'ap-northeast-3',
+    'APS1': 'ap-southeast-1',
+    'APS2': 'ap-southeast-2',
+    'APS3': 'ap-south-1',
+    'APE1': 'ap-east-1',
+    'MES1': 'me-south-1',
+    'AFS1': 'af-south-1',
+}
+"""
+``UsageType`` prefixes (``USW2-BoxUsage:m4.large``) and their region names.
+"""
+
+DEFAULT_REGION = 'us-east-1'
+"""
+Region of the usage types without a region code (``BoxUsage:m4.large``).
+"""
+
+REGION_CODE = re.compile(r'^[A-Z]{2,4}\d?$')
+"""
+Shape of the ``UsageType`` prefixes that are region (or CloudFront edge
+location) codes.
+"""
+
+SIZE_FACTORS = {
+    'nano': 0.25,
+    'micro': 0.5,
+    'small': 1.0,
+    'medium': 2.0,
+    'large': 4.0,
+    'xlarge': 8.0,
+}
+"""
+EC2 instance size normalization factors (see Reserved Instance size
+flexibility); ``<N>xlarge`` sizes are ``N`` times the ``xlarge`` factor.
+"""
+
+
+def region_for(usage_type):
+    """
+    Region name from the ``UsageType`` prefix: :data:`DEFAULT_REGION` when
+    the usage type has no region code, an empty string when there is no usage
+    type or its code is unknown (e.g. a new region or a CloudFront edge
+    location).
+    """
+    if not usage_type:
+        return ''
+    code = usage_type.split('-', 1)[0]
+    if not REGION_CODE.match(code):
+        return DEFAULT_REGION
+    return REGION_CODES.get(code, '')
+
+
+def normalization_factor(size):
+    """
+    Normalization factor of an EC2 instance size (``large`` is 4.0,
+    ``2xlarge`` is 16.0) or None for unknown sizes (e.g. ``metal``).
+    """
+    if size in SIZE_FACTORS:
+        return SIZE_FACTORS[size]
+    multiplier = size[:-len('xlarge')]
+    if size.endswith('xlarge') and multiplier.isdigit():
+        return int(multiplier) * SIZE_FACTORS['xlarge']
+    return None
+
+
+def normalized_units(factor, quantity):
+    """
+    The ``NormalizedUnits`` of a line item: its ``UsageQuantity`` (a string,
+    possibly empty) times the :func:`normalization_factor`.
+    """
+    return factor * float(quantity or 0)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def classify(product_name, operation, usage_type, reserved_instance):
+    """
+    Derive the enrichment fields for a line item. The result is cached and
+    shared between calls, so it must not be modified.
+
+    :returns: dict with ``UsageItem`` and ``Region`` and, for running EC2
+        instances, ``InstanceType``, ``InstanceFamily``, ``InstanceSize`` and
+        ``NormalizationFactor``.
+    :rtype: dict
+    """
+    product_name = product_name or ''
+    operation = operation or ''
+    usage_type = usage_type or ''
+    fields = {'ProductName': product_name, 'Operation': operation,
+              'UsageType': usage_type, 'ReservedInstance': reserved_instance or ''}
+
+    derived = {'UsageItem': '', 'Region': region_for(usage_type)}
+    if product_name == EC2_PRODUCT and EC2_RUN_OPERATION in operation:
+        for field, test, usage_item in USAGE_ITEM_RULES:
+            if test(fields[field]):
+                derived['UsageItem'] = usage_item
+                break
+
+        if ':' in usage_type:
+            instance_type = usage_type.split(':')[1]
+        else:
+            instance_type = 'N/A'
+        derived['InstanceType'] = instance_type
+
+        if '.' in instance_type:
+            family, size = instance_type.split('.', 1)
+            derived['InstanceFamily'] = family
+            derived['InstanceSize'] = size
+            factor = normalization_factor(size)
+            if factor is not None:
+                derived['NormalizationFactor'] = factor
+    return derived
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/loader.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Sends the bulk files written by the ``Output to Elasticsearch Bulk Files``
+output type to one or more Elasticsearch clusters. The files already contain
+the ``_bulk`` action and source lines, so they are posted as they are, without
+parsing or serializing the documents again.
+"""
+import collections
+import glob
+import gzip
+import json
+import os
+import threading
+
+from . import utils
+from .writers import BULK_METADATA
+
+LoadSummary = collections.namedtuple('LoadSummary', 'requests added failed')
+"""
+Holds the summary of a load: bulk requests sent and documents indexed or
+rejected, added up over all target clusters.
+"""
+
+
+class LoadError(Exception):
+    pass
+
+
+def bulk_files(paths):
+    """
+    Expand the given paths (bulk files or directories written by
+    :class:`~awsdbrparser.writers.BulkWriter`) into a sorted list of files.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, 'bulk-*.ndjson*'))))
+        else:
+            files.append(path)
+    return files
+
+
+def read_body(filename):
+    """
+    Read a bulk file as the raw request body, decompressing gzip or zstd files.
+
+    :rtype: bytes
+    """
+    if filename.endswith('.gz'):
+        with gzip.open(filename, 'rb') as f:
+            return f.read()
+    elif filename.endswith('.zst'):
+        import zstandard
+        with open(filename, 'rb') as f:
+            return zstandard.ZstdDecompressor().decompressobj().decompress(f.read())
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+def prepare_index(es, paths, delete_index=False, echo=None):
+    """
+    Create the index and put the mapping described by the ``index.json``
+    metadata found next to the bulk files (if any).
+    """
+    echo = echo or utils.ClickEchoWrapper(quiet=True)
+    for path in paths:
+        filename = os.path.join(path if os.path.isdir(path) else os.path.dirname(path), BULK_METADATA)
+        if not os.path.isfile(filename):
+            continue
+        with open(filename) as f:
+            metadata = json.load(f)
+        if delete_index:
+            echo('Deleting current index: {}'.format(metadata['index']))
+            es.indices.delete(metadata['index'], ignore=404)
+        es.indices.create(metadata['index'], ignore=400)
+        es.indices.put_mapping(index=metadata['index'], doc_type=metadata['doc_type'], body=metadata['mapping'])
+
+
+def load(config, clusters, paths, concurrency, verbose=False):
+    """
+    Send the bulk files found in ``paths`` to every cluster, keeping up to
+    ``concurrency`` requests in flight per cluster.
+
+    :param config: An instance of :class:`~awsdbrparser.config.Config` class,
+        used for client parametrization (timeout, AWS auth, fail fast).
+    :param list clusters: list of Elasticsearch clients, one per cluster.
+    :param list paths: bulk files or directories.
+    :rtype: LoadSummary
+    """
+    from multiprocessing.pool import ThreadPool
+
+    echo = utils.ClickEchoWrapper(quiet=(not verbose))
+    files = bulk_files(paths)
+    echo('Loading {} bulk file(s) into {} cluster(s)'.format(len(files), len(clusters)))
+
+    lock = threading.Lock()
+    totals = {'requests': 0, 'added': 0, 'failed': 0}
+
+    def send(task):
+        es, filename = task
+        response = es.bulk(body=read_body(filename))
+        added = failed = 0
+        for item in response.get('items', []):
+            result = list(item.values())[0]
+            if 200 <= result.get('status', 500) < 300:
+                added += 1
+            else:
+                failed += 1
+                message = 'Failed to index document from {} with result: {!r}'.format(filename, result)
+                if config.fail_fast:
+                    raise LoadError(message)
+                echo(message, err=True)
+        with lock:
+            totals['requests'] += 1
+            totals['added'] += added
+            totals['failed'] += failed
+
+    # interleave clusters so every one of them gets work from the start
+    tasks = [(es, filename) for filename in files for es in clusters]
+    pool = ThreadPool(max(1, concurrency * len(clusters)))
+    try:
+        for _ in pool.imap_unordered(send, tasks):
+            pass
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return LoadSummary(totals['requests'], totals['added'], totals['failed'])
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/parquet.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Columnar output of the enriched DBR documents as Apache Parquet files.
+
+Requires the optional ``pyarrow`` package (``pip install awsdbrparser[parquet]``).
+"""
+
+MAPPING_FLOAT = 'float'
+MAPPING_DATE = 'date'
+
+TYPE_FLOAT = 'float'
+TYPE_TIMESTAMP = 'timestamp'
+TYPE_STRING = 'string'
+TYPE_TAGS = 'tags'
+
+ENRICHED_FIELDS = (
+    ('UsageItem', TYPE_STRING),
+    ('Region', TYPE_STRING),
+    ('InstanceType', TYPE_STRING),
+    ('InstanceFamily', TYPE_STRING),
+    ('InstanceSize', TYPE_STRING),
+    ('NormalizationFactor', TYPE_FLOAT),
+    ('NormalizedUnits', TYPE_FLOAT),
+)
+"""
+Fields added by :func:`~awsdbrparser.utils.pre_process` that are not present
+in every document but must be part of the schema.
+"""
+
+
+def column_types(document, doctype):
+    """
+    Derive the Parquet column kinds for the given (first) document from the
+    document type mapping. Mapped ``float`` fields become doubles, ``date``
+    fields become timestamps, nested dicts (``user:Name`` style tag columns
+    split by :func:`~awsdbrparser.utils.pre_process`) become string maps and
+    everything else is kept as string.
+
+    :param dict document: an enriched document.
+    :param dict doctype: the document type mapping (see :attr:`Config.doctype`).
+    :returns: list of ``(name, kind)`` tuples in document order.
+    :rtype: list
+    """
+    properties = (doctype or {}).get('properties', {})
+    enriched = dict(ENRICHED_FIELDS)
+    columns = []
+    for name, value in document.items():
+        if name is None:
+            # csv.DictReader puts extra values under the None key
+            continue
+        mapped = properties.get(name, {}).get('type')
+        if name in enriched:
+            kind = enriched[name]
+        elif isinstance(value, dict):
+            kind = TYPE_TAGS
+        elif mapped == MAPPING_FLOAT:
+            kind = TYPE_FLOAT
+        elif mapped == MAPPING_DATE:
+            kind = TYPE_TIMESTAMP
+        else:
+            kind = TYPE_STRING
+        columns.append((name, kind))
+    for name, kind in ENRICHED_FIELDS:
+        if name not in document:
+            columns.append((name, kind))
+    return columns
+
+
+class ParquetWriter(object):
+    """
+    Buffers documents column by column and writes them as Parquet row groups
+    of ``row_group_size`` rows, so memory usage is bounded by a single row
+    group regardless of the input size. The schema is derived from the first
+    document written (see :func:`column_types`), or from the document type
+    mapping alone for an empty file.
+    """
+
+    def __init__(self, filename, doctype, row_group_size, compression):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Parquet output requires the "pyarrow" package')
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.filename = filename
+        self.filenames = [filename]
+        self.doctype = doctype
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.rows = 0
+        self._columns = None
+        self._schema = None
+        self._buffer = None
+        self._buffered = 0
+        self._writer = None
+        self._closed = False
+
+    def write(self, document):
+        if self._columns is None:
+            self._start(document)
+        for name, _ in self._columns:
+            self._buffer[name].append(document.get(name))
+        self._buffered += 1
+        self.rows += 1
+        if self._buffered >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffered:
+            return
+        arrays = [self._array(kind, self._buffer[name]) for name, kind in self._columns]
+        table = self._pa.Table.from_arrays(arrays, schema=self._schema)
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+        self._buffer = dict((name, []) for name, _ in self._columns)
+        self._buffered = 0
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is None:
+            # no document, the file still has the mapped columns
+            self._start(dict.fromkeys((self.doctype or {}).get('properties', {})))
+        self.flush()
+        self._writer.close()
+        self._writer = None
+
+    def _start(self, document):
+        pa = self._pa
+        types = {
+            TYPE_FLOAT: pa.float64(),
+            TYPE_TIMESTAMP: pa.timestamp('ms'),
+            TYPE_STRING: pa.string(),
+            TYPE_TAGS: pa.map_(pa.string(), pa.string()),
+        }
+        self._columns = column_types(document, self.doctype)
+        self._schema = pa.schema([(name, types[kind]) for name, kind in self._columns])
+        self._buffer = dict((name, []) for name, _ in self._columns)
+        compression = None if self.compression == 'none' else self.compression
+        self._writer = self._pq.ParquetWriter(self.filename, self._schema, compression=compression)
+
+    def _array(self, kind, values):
+        pa = self._pa
+        if kind == TYPE_TAGS:
+            return pa.array([list(v.items()) if v else None for v in values], type=pa.map_(pa.string(), pa.string()))
+        if kind == TYPE_STRING:
+            return pa.array(values, type=pa.string())
+        elif kind == TYPE_FLOAT:
+            # CSV cells are strings, derived fields are already numbers
+            return pa.array([float(v) if v not in ('', None) else None for v in values], type=pa.float64())
+        # empty cells are nulls, not parse errors
+        return pa.array([v or None for v in values], type=pa.string()).cast(pa.timestamp('ms'))
+
+
+def open_writer(config):
+    """
+    Build the Parquet writer according to the given
+    :class:`~awsdbrparser.config.Config` instance.
+    """
+    return ParquetWriter(config.output_filename, config.doctype,
+                         row_group_size=config.parquet_row_group_size,
+                         compression=config.parquet_compression)
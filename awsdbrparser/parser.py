@@ -20,17 +20,26 @@ from __future__ import print_function
 
 import collections
 import csv
+import gzip
+import io
 import json
 import threading
 import time
 
-import boto3
-import click
-from elasticsearch import Elasticsearch, RequestsHttpConnection, helpers
-from requests_aws4auth import AWS4Auth
-
+from . import aggregations
+from . import parquet
+from . import progress
+from . import rows
+from . import s3
+from . import sinks
+from . import state
+from . import tuning
 from . import utils
+from . import writers
+from .config import ES_SNIFF_INTERVAL
 from .config import PROCESS_BY_BULK, PROCESS_BY_LINE, PROCESS_BI_ONLY
+from .sinks import es_index_successful  # noqa: F401 (kept for backward compatibility)
+from .utils import ParserError  # noqa: F401 (kept for backward compatibility)
 
 Summary = collections.namedtuple('Summary', 'added skipped updated control_messages')
 """
@@ -38,67 +47,168 @@ Holds the summary of documents processed by the parser.
 """
 
 
-class ParserError(Exception):
-    pass
+def elasticsearch_client(config, hosts=None):
+    """
+    Build an Elasticsearch client for the configured hosts (or the given list
+    of ``{'host': ..., 'port': ...}`` dicts), signing requests with the
+    current AWS credentials when ``config.awsauth`` is set. Requests are
+    spread over the hosts with the configured selector and retried on another
+    host after a connection error (see :mod:`awsdbrparser.cluster`).
+
+    The ``elasticsearch``, ``boto3`` and ``requests_aws4auth`` packages are
+    imported here rather than at module level, so runs that never talk to
+    Elasticsearch (file output, ``--version``) do not pay for loading them.
+    """
+    from elasticsearch import Elasticsearch
+
+    from . import cluster
+
+    awsauth = aws_auth(config)
+    hosts = hosts or config.es_hosts
+    sniff = {}
+    if config.es_sniff:
+        sniff = dict(sniff_on_start=True, sniff_on_connection_fail=True, sniffer_timeout=ES_SNIFF_INTERVAL)
+    # timeouts are not retried: documents have no _id, so a bulk request that
+    # timed out but was applied would be indexed twice
+    return Elasticsearch(hosts, timeout=config.es_timeout, http_auth=awsauth,
+                         connection_class=cluster.TrackedConnection,
+                         selector_class=cluster.SELECTORS[config.es_selector],
+                         max_retries=config.es_max_retries, **sniff)
 
 
-def analytics(config, echo):
+def aws_auth(config):
+    """
+    Signer (a ``requests`` auth object) for AWS Signed V4 requests with the
+    current credentials, or None when ``config.awsauth`` is not set or no
+    credentials are found.
     """
-    This function generate extra information in elasticsearch analyzing the line items of the file
+    if not config.awsauth:
+        return None
+
+    import boto3
+    from requests_aws4auth import AWS4Auth
+
+    session = boto3.Session()
+    credentials = session.get_credentials()
+    if not credentials:
+        return None
+    region = session.region_name
+    try:
+        # refreshed on expiry, so long running clients (see serve) keep working
+        return AWS4Auth(region=region, service='es', refreshable_credentials=credentials)
+    except TypeError:  # requests-aws4auth < 1.1 only takes static keys
+        return AWS4Auth(credentials.access_key, credentials.secret_key, region, 'es',
+                        session_token=credentials.token)
+
+
+def open_input(config):
+    """
+    Open the configured input, a local CSV file (decompressed on the fly when
+    its name ends with ``.gz``) or an ``s3://bucket/key`` URL streamed with
+    parallel ranged reads (see :mod:`awsdbrparser.s3`). The rows are read as
+    text, or as byte strings on Python 2.
+    """
+    if s3.is_s3_url(config.input_filename):
+        return s3.open_s3(config, config.input_filename)
+    if utils.PY2:
+        # binary streams, whose tell() is still the position for the progress
+        opener = gzip.open if config.input_filename.endswith('.gz') else io.open
+        return opener(config.input_filename, 'rb')
+    if config.input_filename.endswith('.gz'):
+        return gzip.open(config.input_filename, 'rt', encoding=config.encoding, newline='')
+    return io.open(config.input_filename, 'r', encoding=config.encoding, newline='')
+
+
+def analytics(config, echo, es=None):
+    """
+    This function generate extra information in elasticsearch analyzing the line items of the file.
+    With ``config.analytics_state`` the accumulated analytics are saved to
+    that file (see :mod:`awsdbrparser.state`): a later run only folds in the
+    line items added to the DBR since and re-emits the documents of the days
+    they belong to.
+
     :param echo:
     :param config:
+    :param es: Elasticsearch client to use, a new one when None.
     :return:
     """
 
     # Opening Input filename again to run in parallel
-    file_in = open(config.input_filename, 'r')
-    awsauth = None
-    if config.awsauth:
-        session = boto3.Session()
-        credentials = session.get_credentials()
-        if credentials:
-            region = session.region_name
-            awsauth = AWS4Auth(credentials.access_key, credentials.secret_key, region, 'es',
-                               session_token=credentials.token)
-
-    es = Elasticsearch([{'host': config.es_host, 'port': config.es_port}], timeout=config.es_timeout, http_auth=awsauth,
-                       connection_class=RequestsHttpConnection)
+    file_in = open_input(config)
+    if es is None:
+        es = elasticsearch_client(config)
     es.indices.create(config.index_name, ignore=400)
     es.indices.create(config.es_doctype, ignore=400)
 
-    csv_file = csv.DictReader(file_in, delimiter=config.csv_delimiter)
-    analytics_daytime = dict()
-    analytics_day_only = dict()
-    for recno, json_row in enumerate(csv_file):
-        # Pre-Process the row to append extra information
-        json_row = utils.pre_process(json_row)
-        if is_control_message(json_row, config):
-            # Skip this line
-            continue
-        elif json_row.get('ProductName') == 'Amazon Elastic Compute Cloud' and 'RunInstances' in json_row.get(
-                'Operation') and json_row.get('UsageItem'):
-            # Get the day time ('2016-03-01 01:00:00')
-            daytime = json_row.get('UsageStartDate')
-            # the day only '2016-03-01'
-            day = json_row.get('UsageStartDate').split(' ')[0]
-            # Add the day time to the dict
-            analytics_daytime.setdefault(daytime, {"Count": 0, "Cost": 0.00, "RI": 0, "Spot": 0, "Unblended": 0.00})
-            # Increment the count of total instances
-            analytics_daytime[daytime]["Count"] += 1
-            analytics_daytime[daytime]["Unblended"] += float(json_row.get('UnBlendedCost', 0.00))
-            analytics_daytime[daytime]["Cost"] += float(json_row.get('Cost', 0.00))
-
-            # Add the day only to the dict
-            analytics_day_only.setdefault(day, {"Count": 0, "RI": 0, "Spot": 0, "Min": None, "Max": None})
-            analytics_day_only[day]["Count"] += 1
-            # Increment the count of RI or Spot if the instance is one or other
-            if json_row.get('UsageItem') == 'Reserved Instance':
-                analytics_day_only[day]["RI"] += 1
-                analytics_daytime[daytime]["RI"] += 1
-            elif json_row.get('UsageItem') == 'Spot Instance':
-                analytics_day_only[day]["Spot"] += 1
-                analytics_daytime[daytime]["Spot"] += 1
+    if config.analytics_state:
+        accumulated = state.load(config.analytics_state, config)
+    else:
+        accumulated = state.AnalyticsState(config)
+    counts = {}
+    days = None
+
+    # enriched documents, control messages are skipped
+    documents = iter_documents(config, file_in, counts, skip=max(accumulated.records - 1, 0))
+    if accumulated.records:
+        # the last line item folded in must be unchanged, the rows before it are skipped
+        last = next(documents, None)
+        if last is None or counts['records'] != accumulated.records or \
+                state.document_digest(last) != accumulated.digest:
+            echo('The input file does not extend the saved analytics state, computing them again')
+            file_in.close()
+            file_in = open_input(config)
+            accumulated = state.AnalyticsState(config)
+            counts = {}
+            documents = iter_documents(config, file_in, counts)
+        else:
+            echo('Resuming the analytics after {} record(s)'.format(accumulated.records))
+            days = set()
+
+    for json_row in documents:
+        day = accumulated.add(json_row, counts['records'])
+        if days is not None:
+            days.add(day)
+
+    if days is None or days:
+        analytics_daytime = accumulated.hourly
+        analytics_day_only = aggregations.daily_usage(analytics_daytime)
+        write_analytics(es, config, analytics_daytime, analytics_day_only, echo, days=days)
+        write_resource_analytics(es, config, accumulated.resources, echo, days=days)
 
+    if config.analytics_state:
+        state.save(config.analytics_state, config, accumulated)
+
+    file_in.close()
+    # Finished Processing
+    return
+
+
+def analytics_from_index(config, echo, es=None):
+    """
+    Generate the same extra information as :func:`analytics` from the line
+    items already indexed in Elasticsearch: the hourly EC2 usage is computed
+    by the cluster (see :mod:`awsdbrparser.aggregations`) and only the
+    aggregated buckets are sent back, so no input file is needed.
+    """
+    if es is None:
+        es = elasticsearch_client(config)
+    echo('Aggregating EC2 usage from index: {}'.format(config.index_name))
+    response = es.search(index=config.index_name, doc_type=config.es_doctype,
+                         body=aggregations.hourly_usage_query(config))
+    analytics_daytime = aggregations.hourly_usage(response)
+    analytics_day_only = aggregations.daily_usage(analytics_daytime)
+    echo('Found EC2 usage in {} hour(s) of {} day(s)'.format(len(analytics_daytime), len(analytics_day_only)))
+    write_analytics(es, config, analytics_daytime, analytics_day_only, echo)
+
+
+def write_analytics(es, config, analytics_daytime, analytics_day_only, echo, days=None):
+    """
+    Index the EC2 per USD (hourly) and elasticity, RI and Spot coverage
+    (daily) documents from the EC2 usage collected by :func:`analytics` or
+    :func:`analytics_from_index`, only for the given ``days`` when not None.
+    With ``config.analytics_state`` the documents have ids made of the account
+    and date, so the documents re-emitted for a day replace the previous ones.
+    """
     # Some DBR files has Cost (Single Account) and some has (Un)BlendedCost (Consolidated Account)
     # In this case we try to process both, but one will be zero and we need to check
     # TODO: use a single variable and an flag to output Cost or Unblended
@@ -116,15 +226,18 @@ def analytics(config, echo):
                 }
             }
         })
-    for k, v in analytics_daytime.items():
-        result_cost = 1.0 / (v.get('Cost') / v.get('Count')) if v.get('Cost') else 0.00
-        result_unblended = 1.0 / (v.get('Unblended') / v.get('Count')) if v.get('Unblended') else 0.0
-        response = es.index(index=index_name, doc_type='ec2_per_usd',
-                            body={'UsageStartDate': k,
-                                  'EPU_Cost': result_cost,
-                                  'EPU_UnBlended': result_unblended})
-        if not response.get('created'):
-            echo('[!] Unable to send document to ES!')
+    with bulk_load(es, config, [index_name], echo):
+        for k, v in analytics_daytime.items():
+            if days is not None and k.split(' ')[0] not in days:
+                continue
+            result_cost = 1.0 / (v.get('Cost') / v.get('Count')) if v.get('Cost') else 0.00
+            result_unblended = 1.0 / (v.get('Unblended') / v.get('Count')) if v.get('Unblended') else 0.0
+            response = es.index(index=index_name, doc_type='ec2_per_usd', id=_analytics_id(config, k),
+                                body={'UsageStartDate': k,
+                                      'EPU_Cost': result_cost,
+                                      'EPU_UnBlended': result_unblended})
+            if not sinks.es_index_successful(response):
+                echo('[!] Unable to send document to ES!')
 
     # Elasticity
     #
@@ -145,78 +258,245 @@ def analytics(config, echo):
                 }
             }
         })
-    for k, v in analytics_day_only.items():
-        ec2_min = min(value["Count"] - value["RI"] for key, value in analytics_daytime.items() if k in key)
-        ec2_max = max(value["Count"] - value["RI"] for key, value in analytics_daytime.items() if k in key)
-        if ec2_max:
-            elasticity = 1.0 - float(ec2_min) / float(ec2_max)
-        else:
-            elasticity = 1.0
+    with bulk_load(es, config, [index_name], echo):
+        for k, v in analytics_day_only.items():
+            if days is not None and k not in days:
+                continue
+            ec2_min = min(value["Count"] - value["RI"] for key, value in analytics_daytime.items() if k in key)
+            ec2_max = max(value["Count"] - value["RI"] for key, value in analytics_daytime.items() if k in key)
+            if ec2_max:
+                elasticity = 1.0 - float(ec2_min) / float(ec2_max)
+            else:
+                elasticity = 1.0
 
-        ri_coverage = float(analytics_day_only[k]["RI"]) / float(analytics_day_only[k]["Count"])
-        spot_coverage = float(analytics_day_only[k]["Spot"]) / float(analytics_day_only[k]["Count"])
+            ri_coverage = float(analytics_day_only[k]["RI"]) / float(analytics_day_only[k]["Count"])
+            spot_coverage = float(analytics_day_only[k]["Spot"]) / float(analytics_day_only[k]["Count"])
 
 
-        response = es.index(index=index_name, doc_type='elasticity',
-                            body={'UsageStartDate': k + ' 12:00:00',
-                                  'Elasticity': elasticity,
-                                  'ReservedInstanceCoverage': ri_coverage,
-                                  'SpotCoverage': spot_coverage})
+            response = es.index(index=index_name, doc_type='elasticity', id=_analytics_id(config, k),
+                                body={'UsageStartDate': k + ' 12:00:00',
+                                      'Elasticity': elasticity,
+                                      'ReservedInstanceCoverage': ri_coverage,
+                                      'SpotCoverage': spot_coverage})
 
-        if not response.get('created'):
-            echo('[!] Unable to send document to ES!')
+            if not sinks.es_index_successful(response):
+                echo('[!] Unable to send document to ES!')
 
-    file_in.close()
-    # Finished Processing
-    return
+
+def write_resource_analytics(es, config, resources, echo, days=None):
+    """
+    Index the ``top_resources`` and ``distinct_resources`` documents of a
+    :class:`~awsdbrparser.sketches.ResourceStats`, one bulk request per
+    ``config.bulk_size`` documents, only for the given ``days`` when not None.
+    """
+    keyword = {'type': 'string', 'index': 'not_analyzed'} if config.es2 else {'type': 'keyword'}
+    outputs = (
+        ('top_resources', resources.top_documents(days), {'ResourceId': keyword}, 'Rank'),
+        ('distinct_resources', resources.distinct_documents(days), {'ProductName': keyword}, 'ProductName'),
+    )
+    for doc_type, documents, properties, id_field in outputs:
+        index_name = config.index_name if config.es2 else doc_type
+        properties = dict(properties, UsageStartDate={"type": "date", "format": "YYYY-MM-dd HH:mm:ss"})
+        es.indices.create(index_name, ignore=400)
+        es.indices.put_mapping(index=index_name, doc_type=doc_type, body={doc_type: {"properties": properties}})
+        action = {'_index': index_name, '_type': doc_type}
+        with bulk_load(es, config, [index_name], echo):
+            for batch in batches(documents, config.bulk_size):
+                body = ''.join('{}\n{}\n'.format(json.dumps({'index': _with_id(action, config, document, id_field)}),
+                                                 json.dumps(document)) for document in batch)
+                response = es.bulk(body=body)
+                if response.get('errors'):
+                    echo('[!] Unable to send {} documents to ES!'.format(doc_type))
+
+
+def bulk_load(es, config, indices, echo):
+    """
+    Context manager tuning ``indices`` for the load that follows when
+    ``config.es_bulk_load`` is set (see :func:`awsdbrparser.tuning.bulk_load`).
+    """
+    return tuning.bulk_load(es, indices if config.es_bulk_load else [], force_merge=config.es_force_merge,
+                            echo=echo)
+
+
+def _analytics_id(config, *parts):
+    # deterministic analytics document ids, so incremental runs replace them
+    if not config.analytics_state:
+        return None
+    return '-'.join(str(part) for part in (config.account_id,) + parts)
+
+
+def _with_id(action, config, document, id_field):
+    doc_id = _analytics_id(config, document['UsageStartDate'][:10], document[id_field])
+    return dict(action, _id=doc_id) if doc_id else action
+
+
+def _read_rows(config, file_in, counts, build, skip=0):
+    # yields build(layout)(row) for the line items, skipping control messages
+    counts = counts if counts is not None else {}
+    counts.setdefault('records', 0)
+    counts.setdefault('control_messages', 0)
+    close = file_in is None
+    if close:
+        file_in = open_input(config)
+    try:
+        reader = csv.reader(file_in, delimiter=config.csv_delimiter)
+        header = next(reader, None)
+        if header is None:
+            return
+        layout = rows.Layout(header)
+        is_control = layout.control_filter(config.bulk_msg)
+        make = build(layout)
+        records = control_messages = 0
+        # If you wish to sort the records by UsageStartDate before sending them
+        # just wrap the reader below with:
+        # sorted(reader, key=lambda line: line[layout.index["UsageStartDate"]])
+        for row in reader:
+            if not row:
+                # blank lines are skipped, like csv.DictReader does
+                continue
+            records += 1
+            if records <= skip:
+                counts['records'] = records
+                continue
+            counts['records'] = records
+            if is_control(row):
+                control_messages += 1
+                counts['control_messages'] = control_messages
+                continue
+            yield make(row)
+    finally:
+        if close:
+            file_in.close()
+
+
+def iter_documents(config, file_in=None, counts=None, skip=0):
+    """
+    Lazily read the input DBR and yield the enriched documents (see
+    :func:`~awsdbrparser.utils.pre_process`), skipping control messages.
+    Rows are read as plain lists and turned into documents by the
+    :class:`~awsdbrparser.rows.Layout` compiled from the header.
+
+    :param config: An instance of :class:`~awsdbrparser.config.Config` class,
+        used for parsing parametrization.
+    :param file_in: an already open input stream; when omitted the configured
+        input is opened (see :func:`open_input`) and closed at the end.
+    :param dict counts: optional dict updated in place with the number of
+        ``records`` read and ``control_messages`` skipped so far.
+    :param int skip: number of records (line items or control messages) to
+        skip without processing them, e.g. when resuming.
+    """
+    return _read_rows(config, file_in, counts, lambda layout: layout.document, skip)
 
 
-def parse(config, verbose=False):
+def iter_records(config, file_in=None, counts=None):
+    """
+    Like :func:`iter_documents`, but yield a read-only
+    :class:`~awsdbrparser.rows.Record` view of each raw row (no enrichment,
+    tags not nested), for consumers that only need a few columns.
+    """
+    return _read_rows(config, file_in, counts, lambda layout: layout.record)
+
+
+def batches(iterable, size):
+    """
+    Group items of ``iterable`` in lists of at most ``size`` items.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def open_sink(config, echo):
+    """
+    Build the :class:`~awsdbrparser.sinks.Sink` for the configured output type
+    and process mode, preparing the Elasticsearch index when needed.
+    """
+    if config.output_to_file:
+        echo('Opening output file: {}'.format(config.output_filename))
+        return sinks.WriterSink(writers.open_writer(config), encodes=True)
+
+    elif config.output_to_parquet:
+        echo('Opening Parquet output file: {}'.format(config.output_filename))
+        return sinks.WriterSink(parquet.open_writer(config))
+
+    elif config.output_to_bulk_files:
+        echo('Writing Elasticsearch bulk files to: {}'.format(config.output_filename))
+        return sinks.WriterSink(writers.open_bulk_writer(config), encodes=True)
+
+    echo('Sending DBR to Elasticsearch host: {}'.format(
+        ', '.join('{host}:{port}'.format(**host) for host in config.es_hosts)))
+    es = elasticsearch_client(config)
+    prepare_index(es, config, echo)
+    return elasticsearch_sink(es, config, echo)
+
+
+def prepare_index(es, config, echo):
+    """
+    Create the configured index (deleting it first when ``config.delete_index``
+    is set) and put the document type mapping.
+    """
+    if config.delete_index:
+        echo('Deleting current index: {}'.format(config.index_name))
+        es.indices.delete(config.index_name, ignore=404)
+    es.indices.create(config.index_name, ignore=400)
+    es.indices.put_mapping(index=config.index_name, doc_type=config.es_doctype, body=config.mapping)
+
+
+def elasticsearch_sink(es, config, echo, loop=None):
+    """
+    Elasticsearch sink for the configured process mode (bulk or line by line),
+    sending the requests from an asyncio event loop with ``config.es_async``
+    (see :mod:`awsdbrparser.aio`).
+
+    :param loop: :class:`awsdbrparser.aio.EventLoop` shared by the async
+        sinks, a new one per sink when None.
+    """
+    if config.es_async:
+        if config.check and config.process_mode == PROCESS_BY_LINE:
+            echo('The --check flag is not supported with --async, sending one request at a time')
+        else:
+            from . import aio
+
+            return aio.AsyncElasticsearchSink(config, echo=echo, auth=aws_auth(config), loop=loop)
+    if config.process_mode == PROCESS_BY_BULK:
+        return sinks.ElasticsearchBulkSink(es, config, echo=echo)
+    return sinks.ElasticsearchLineSink(es, config, echo=echo)
+
+
+def parse(config, verbose=False, sink=None, es=None):
     """
 
     :param verbose:
     :param config: An instance of :class:`~awsdbrparser.config.Config` class,
         used for parsing parametrization.
+    :param sink: An instance of :class:`~awsdbrparser.sinks.Sink` receiving the
+        documents; defaults to the sink for the configured output type.
+    :param es: Elasticsearch client used by the analytics and the bulk load
+        tuning (e.g. kept warm between ``serve`` jobs); a new one when None.
 
     :rtype: Summary
     """
     echo = utils.ClickEchoWrapper(quiet=(not verbose))
 
+    if config.process_mode == PROCESS_BI_ONLY and config.analytics and config.analytics_from_index:
+        # nothing to read nor write, the line items are already indexed
+        echo('Processing BI Only from the indexed line items')
+        analytics_from_index(config, echo, es)
+        echo('Finished processing!')
+        return Summary(0, 0, 0, 0)
 
     echo('Opening input file: {}'.format(config.input_filename))
-    file_in = open(config.input_filename, 'r')
+    file_in = open_input(config)
 
-    if config.output_to_file:
-        echo('Opening output file: {}'.format(config.output_filename))
-        file_out = open(config.output_filename, 'w')
-
-    elif config.output_to_elasticsearch:
-        echo('Sending DBR to Elasticsearch host: {}:{}'.format(config.es_host, config.es_port))
-        awsauth = None
-        if config.awsauth:
-            session = boto3.Session()
-            credentials = session.get_credentials()
-            if credentials:
-                region = session.region_name
-                awsauth = AWS4Auth(credentials.access_key, credentials.secret_key, region, 'es',
-                                   session_token=credentials.token)
-
-        es = Elasticsearch([{'host': config.es_host, 'port': config.es_port}], timeout=config.es_timeout,
-                           http_auth=awsauth, connection_class=RequestsHttpConnection)
-        if config.delete_index:
-            echo('Deleting current index: {}'.format(config.index_name))
-            es.indices.delete(config.index_name, ignore=404)
-        es.indices.create(config.index_name, ignore=400)
-        es.indices.put_mapping(index=config.index_name, doc_type=config.es_doctype, body=config.mapping)
+    if sink is None:
+        sink = open_sink(config, echo)
 
     if verbose:
-        progressbar = click.progressbar
-
-        # calculate number of rows in input file in preparation to display a progress bar
-        record_count = sum(1 for _ in file_in) - 1
-        file_in.seek(0)  # reset file descriptor
-
-        echo("Input file has {} record(s)".format(record_count))
 
         if config.process_mode == PROCESS_BY_BULK:
             echo('Processing in BULK MODE, size: {}'.format(config.bulk_size))
@@ -227,156 +507,82 @@ def parse(config, verbose=False):
                 echo('Processing BI Only')
             else:
                 echo("You don't have set the parameter -bi. Nothing to do.")
-    else:
-        # uses a 100% bug-free progressbar, guaranteed :-)
-        progressbar = utils.null_progressbar
-        record_count = 0
 
     # If BI is enabled, create a thread and start running
     analytics_start = time.time()
     if config.analytics:
         echo('Starting the BI Analytics Thread')
-        thread = threading.Thread(target=analytics, args=(config, echo,))
+        thread = threading.Thread(target=analytics, args=(config, echo, es))
         thread.start()
 
-    added = skipped = updated = control = 0
+    counts = {}
+    # progress from the byte position of the input, the line is only drawn on a terminal
+    tracker = progress.Progress(file_in, sink, echo=echo if verbose and utils.is_terminal() else None,
+                                status_file=config.status_file, status_interval=config.status_interval)
+    if tracker.size is not None:
+        echo('Input file has {:.1f} MB'.format(tracker.size / progress.MEGABYTE))
+
+    try:
+        if config.process_mode in (PROCESS_BY_BULK, PROCESS_BY_LINE):
+            # refresh and replicas are restored (even on errors or Ctrl-C) after the last document is sent
+            tuned = [config.index_name] if config.es_bulk_load and config.output_to_elasticsearch else []
+            if tuned and es is None:
+                es = elasticsearch_client(config)
+            with bulk_load(es, config, tuned, echo):
+                for batch in batches(iter_documents(config, file_in, counts), config.bulk_size):
+                    if config.debug and not sink.encodes:
+                        for document in batch:
+                            print(json.dumps(document, ensure_ascii=False))  # do not use 'echo()' here
+                    sink.write_many(batch)
+                    tracker.update(counts['records'])
+                # the buffered and in flight documents are sent before the index settings are restored
+                sink.flush()
+
+        elif config.process_mode == PROCESS_BI_ONLY and config.analytics:
+            echo('Processing Analytics Only')
+            while thread.is_alive():
+                # Wait for a timeout
+                analytics_now = time.time()
+                if analytics_start - analytics_now > config.analytics_timeout * 60:
+                    echo('Analytics processing timeout. exiting')
+                    break
+                time.sleep(5)
 
-    if config.process_mode == PROCESS_BY_BULK:
-        with progressbar(length=record_count) as pbar:
-            # If you wish to sort the records by UsageStartDate before send to
-            # ES just uncomment the 2 lines below and comment the third line
-            # reader = csv.DictReader(file_in, delimiter=config.csv_delimiter)
-            # csv_file = sorted(reader, key=lambda line: line["UsageStartDate"]+line["UsageEndDate"])
-            csv_file = csv.DictReader(file_in, delimiter=config.csv_delimiter)
-
-            def documents():
-                for json_row in csv_file:
-                    if not is_control_message(json_row, config):
-                        if config.debug:
-                            print(json.dumps(  # do not use 'echo()' here
-                                utils.pre_process(json_row)))
-                        yield json.dumps(utils.pre_process(json_row))
-                        pbar.update(1)
-
-            for recno, (success, result) in enumerate(helpers.streaming_bulk(es, documents(),
-                                                                             index=config.index_name,
-                                                                             doc_type=config.es_doctype,
-                                                                             chunk_size=config.bulk_size)):
-                # <recno> integer, the record number (0-based)
-                # <success> bool
-                # <result> a dictionary like this one:
-                #
-                #   {
-                #       'create': {
-                #           'status': 201,
-                #           '_type': 'billing',
-                #           '_shards': {
-                #               'successful': 1,
-                #               'failed': 0,
-                #               'total': 2
-                #           },
-                #           '_index': 'billing-2015-12',
-                #           '_version': 1,
-                #           '_id': u'AVOmiEdSF_o3S6_4Qeur'
-                #       }
-                #   }
-                #
-                if not success:
-                    message = 'Failed to index record {:d} with result: {!r}'.format(recno, result)
-                    if config.fail_fast:
-                        raise ParserError(message)
-                    else:
-                        echo(message, err=True)
-                else:
-                    added += 1
-
-    elif config.process_mode == PROCESS_BY_LINE:
-        with progressbar(length=record_count) as pbar:
-            csv_file = csv.DictReader(file_in, delimiter=config.csv_delimiter)
-            for recno, json_row in enumerate(csv_file):
-                if is_control_message(json_row, config):
-                    control += 1
-                else:
-                    if config.debug:
-                        print(json.dumps(  # do not use 'echo()' here
-                            utils.pre_process(json_row),
-                            ensure_ascii=False))
-
-                    if config.output_to_file:
-                        file_out.write(
-                            json.dumps(utils.pre_process(json_row), ensure_ascii=False))
-                        file_out.write('\n')
-                        added += 1
-
-                    elif config.output_to_elasticsearch:
-                        if config.check:
-                            # FIXME: the way it was, `search_exists` will not suffice, since we'll need the document _id for the update operation; # noqa
-                            # FIXME: use `es.search` with the following sample body: `{'query': {'match': {'RecordId': '43347302922535274380046564'}}}`; # noqa
-                            # SEE: https://elasticsearch-py.readthedocs.org/en/master/api.html#elasticsearch.Elasticsearch.search; # noqa
-                            response = es.search_exists(index=config.es_doctype, doc_type=config.es_doctype,
-                                                        q='RecordId:{}'.format(json_row['RecordId']))
-                            if response:
-                                if config.update:
-                                    # TODO: requires _id from the existing document
-                                    # FIXME: requires use of `es.search` method instead of `es.search_exists`
-                                    # SEE: https://elasticsearch-py.readthedocs.org/en/master/api.html#elasticsearch.Elasticsearch.update; # noqa
-                                    skipped += 1
-                                else:
-                                    skipped += 1
-                            else:
-                                response = es.index(index=config.es_doctype, doc_type=config.es_doctype,
-                                                    body=body_dump(json_row, config))
-                                if not es_index_successful(response):
-                                    message = 'Failed to index record {:d} with result {!r}'.format(recno, response)
-                                    if config.fail_fast:
-                                        raise ParserError(message)
-                                    else:
-                                        echo(message, err=True)
-                                else:
-                                    added += 1
-                        else:
-                            response = es.index(index=config.es_doctype, doc_type=config.es_doctype,
-                                                body=body_dump(json_row, config))
-                            if not es_index_successful(response):
-                                message = 'Failed to index record {:d} with result {!r}'.format(recno, response)
-                                if config.fail_fast:
-                                    raise ParserError(message)
-                                else:
-                                    echo(message, err=True)
-                            else:
-                                added += 1
-
-                pbar.update(1)
-    elif config.process_mode == PROCESS_BI_ONLY and config.analytics:
-        echo('Processing Analytics Only')
-        while thread.is_alive():
-            # Wait for a timeout
-            analytics_now = time.time()
-            if analytics_start - analytics_now > config.analytics_timeout * 60:
-                echo('Analytics processing timeout. exiting')
-                break
-            time.sleep(5)
-
-    else:
-        echo('Nothing to do!')
-
-    file_in.close()
-
-    if config.output_to_file:
-        file_out.close()
+        else:
+            echo('Nothing to do!')
+
+        file_in.close()
+
+        sink.close()
+    except BaseException as e:
+        if config.process_mode in (PROCESS_BY_BULK, PROCESS_BY_LINE):
+            # the status file must not stay "running" for the job monitors
+            tracker.fail(counts.get('records', 0), e)
+        raise
+
+    if config.process_mode in (PROCESS_BY_BULK, PROCESS_BY_LINE):
+        # after close, so the documents still in flight are acknowledged
+        tracker.finish(counts.get('records', 0))
+    filenames = getattr(sink, 'filenames', [])
+    if len(filenames) > 1:
+        echo('Wrote {} output file(s) to: {}'.format(len(filenames), config.output_filename))
+    elif filenames and filenames[0] != config.output_filename:
+        echo('Wrote output file: {}'.format(filenames[0]))
 
     echo('Finished processing!')
     echo('')
 
+    control = counts.get('control_messages', 0)
+
     # the first line is the header then is skipped by the count bellow
     echo('Summary of documents processed...')
-    echo('           Added: {}'.format(added))
-    echo('         Skipped: {}'.format(skipped))
-    echo('         Updated: {}'.format(updated))
+    echo('           Added: {}'.format(sink.added))
+    echo('         Skipped: {}'.format(sink.skipped))
+    echo('         Updated: {}'.format(sink.updated))
     echo('Control messages: {}'.format(control))
     echo('')
 
-    return Summary(added, skipped, updated, control)
+    return Summary(sink.added, sink.skipped, sink.updated, control)
 
 
 def is_control_message(record, config):
@@ -391,33 +597,3 @@ def body_dump(record, config):
     # <config> an instance of `awsdbrparser.config.Config`
     body = json.dumps(utils.pre_process(record), ensure_ascii=False)
     return body
-
-
-def es_index_successful(response):
-    """
-    Test if an Elasticsearch client ``index`` method response indicates a
-    successful index operation. The response parameter should be a dictionary
-    with following keys:
-
-    .. sourcecode:: python
-
-        {
-            '_shards': {
-                'total': 2,
-                'failed': 0,
-                'successful': 1
-            },
-            '_index': u'billing-2015-12',
-            '_type': u'billing',
-            '_id': u'AVOmKFXgF_o3S6_4PkP1',
-            '_version': 1,
-            'created': True
-        }
-
-    According to `Elasticsearch Index API <https://www.elastic.co/guide/en/
-    elasticsearch/reference/current/docs-index_.html>`, an index operation is
-    successful in the case ``successful`` is at least 1.
-
-    :rtype: bool
-    """
-    return response.get('_shards', {}).get('successful', 0) >= 1
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/progress.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Parsing progress driven by the byte position of the input (the compressed
+stream for ``.gz`` inputs), so the input is read only once and quoted
+newlines inside fields don't skew it. Reports the rows/s, MB/s, documents
+acknowledged by the sink and an ETA on the terminal and, optionally, to a
+JSON status file (``--status-file``) for job monitors.
+"""
+from __future__ import division
+
+import datetime
+import io
+import json
+import os
+import time
+
+REFRESH_INTERVAL = 1.0
+"""
+Seconds between two samples of the progress (terminal refresh).
+"""
+
+SMOOTHING = 0.3
+"""
+Weight of the last sample in the reported rates (exponential moving average).
+"""
+
+MEGABYTE = 1024.0 * 1024.0
+
+
+def byte_stream(file_in):
+    """
+    The binary stream under a text input, whose ``tell()`` is the number of
+    bytes read from the file: for gzip inputs the compressed stream.
+    """
+    stream = getattr(file_in, 'buffer', file_in)
+    return getattr(stream, 'fileobj', None) or stream
+
+
+def stream_size(stream):
+    """
+    Size in bytes of the file under a :func:`byte_stream`, or None when
+    unknown.
+    """
+    raw = getattr(stream, 'raw', stream)
+    size = getattr(raw, 'size', None)  # see awsdbrparser.s3.S3RangeReader
+    if size is None:
+        try:
+            size = os.fstat(raw.fileno()).st_size
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return None
+    return size
+
+
+class Progress(object):
+    """
+    Tracks the parsing of ``file_in`` into ``sink``. Call :meth:`update` with
+    the number of records read after each batch and :meth:`finish` at the end
+    (or :meth:`fail` when the parsing stopped on an error).
+
+    :param echo: callable showing the progress line on a terminal (``\\r``
+        redrawn), or None.
+    :param status_file: file rewritten every ``status_interval`` seconds with
+        the :meth:`status` as JSON, or None.
+    """
+
+    def __init__(self, file_in, sink, echo=None, status_file=None, status_interval=10, clock=time.time):
+        stream = byte_stream(file_in)
+        self.name = getattr(file_in, 'name', None)
+        self.sink = sink
+        self.echo = echo
+        self.status_file = status_file
+        self.status_interval = status_interval
+        self.size = stream_size(stream)
+        self.records = 0
+        self.position = 0
+        self.rows_per_second = 0.0
+        self.bytes_per_second = 0.0
+        self.clock = clock
+        self.started = self._sampled = self._written = clock()
+        self._sampled_records = self._sampled_position = 0
+        self._tell = getattr(stream, 'tell', None)
+
+    def update(self, records):
+        self.records = records
+        now = self.clock()
+        if now - self._sampled < REFRESH_INTERVAL:
+            return
+        self._sample(now)
+        if self.echo is not None:
+            self.echo('\r' + self.line(), nl=False)
+        if self.status_file and now - self._written >= self.status_interval:
+            self._write('running')
+            self._written = now
+
+    def finish(self, records):
+        self.records = records
+        self._sample(self.clock())
+        if self.size is not None:
+            self.position = self.size
+        # the final rates are the averages of the whole run
+        elapsed = self._sampled - self.started
+        if elapsed > 0:
+            self.rows_per_second = records / elapsed
+            self.bytes_per_second = self.position / elapsed
+        if self.echo is not None:
+            self.echo('\r' + self.line())
+        if self.status_file:
+            self._write('finished')
+
+    def fail(self, records, error):
+        self.records = records
+        self._sample(self.clock())
+        if self.echo is not None:
+            self.echo('')  # ends the progress line
+        if self.status_file:
+            self._write('failed', error)
+
+    def status(self, state='running', error=None):
+        elapsed = self._sampled - self.started
+        return {'state': state,
+                'error': None if error is None else repr(error),
+                'input': self.name,
+                'bytes_read': self.position,
+                'bytes_total': self.size,
+                'percent': self.percent(),
+                'records': self.records,
+                'acknowledged': self.sink.added,
+                'rows_per_second': round(self.rows_per_second, 1),
+                'mb_per_second': round(self.bytes_per_second / MEGABYTE, 2),
+                'elapsed_seconds': round(elapsed, 1),
+                'eta_seconds': self.eta(),
+                'updated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+
+    def percent(self):
+        if not self.size:
+            return None
+        return round(100.0 * min(self.position, self.size) / self.size, 1)
+
+    def eta(self):
+        """
+        Seconds left at the current read rate, or None when unknown.
+        """
+        if not self.size or not self.bytes_per_second:
+            return None
+        return int(max(self.size - self.position, 0) / self.bytes_per_second)
+
+    def line(self):
+        parts = []
+        if self.size:
+            parts.append('{:5.1f}% of {:.1f} MB'.format(self.percent(), self.size / MEGABYTE))
+        else:
+            parts.append('{:.1f} MB'.format(self.position / MEGABYTE))
+        parts.append('{:,} rows ({:,.0f} rows/s, {:.1f} MB/s)'.format(
+            self.records, self.rows_per_second, self.bytes_per_second / MEGABYTE))
+        parts.append('{:,} acknowledged'.format(self.sink.added))
+        eta = self.eta()
+        if eta is not None:
+            parts.append('ETA {}'.format(datetime.timedelta(seconds=eta)))
+        return '  '.join(parts)
+
+    def _sample(self, now):
+        if self._tell is not None:
+            try:
+                self.position = self._tell()
+            except (OSError, ValueError, io.UnsupportedOperation):
+                self._tell = None  # not seekable nor counting, only rows are reported
+        elapsed = now - self._sampled
+        if elapsed > 0:
+            rows = (self.records - self._sampled_records) / elapsed
+            read = (self.position - self._sampled_position) / elapsed
+            first = self._sampled == self.started
+            self.rows_per_second = rows if first else SMOOTHING * rows + (1 - SMOOTHING) * self.rows_per_second
+            self.bytes_per_second = read if first else SMOOTHING * read + (1 - SMOOTHING) * self.bytes_per_second
+        self._sampled = now
+        self._sampled_records = self.records
+        self._sampled_position = self.position
+
+    def _write(self, state, error=None):
+        temp = self.status_file + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self.status(state, error), f, indent=2, sort_keys=True)
+        os.rename(temp, self.status_file)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/rows.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Positional row model. The DBR header is compiled once per file into a
+:class:`Layout`, which turns the rows read by :func:`csv.reader` (plain
+lists of values) straight into output documents and checks for control
+messages by column position, so the only per row allocation is the document
+itself.
+"""
+import operator
+
+from . import enrichment
+from . import utils
+
+CLASSIFY_COLUMNS = ('ProductName', 'Operation', 'UsageType', 'ReservedInstance')
+
+
+def _getter(indexes):
+    # itemgetter returns a bare value instead of a tuple for a single index
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda row: (row[index],)
+    return operator.itemgetter(*indexes)
+
+
+class Layout(object):
+    """
+    Column positions of a DBR header. ``key:subkey`` columns (e.g. the
+    ``user:Name`` tags) are grouped into nested dicts, as done by
+    :func:`~awsdbrparser.utils.pre_process`.
+    """
+
+    def __init__(self, header):
+        self.header = list(header)
+        self.width = len(self.header)
+        # like csv.DictReader, the last column of a repeated name wins
+        self.index = dict((name, position) for position, name in enumerate(self.header))
+        plain, nested = [], {}
+        for name in sorted(self.index, key=self.header.index):
+            if ':' in name:
+                key, subkey = name.split(':', 1)
+                nested.setdefault(key, []).append((subkey, self.index[name]))
+            else:
+                plain.append((name, self.index[name]))
+
+        self.document = self._compile(plain, nested)
+
+    def fit(self, row):
+        """
+        Pad short rows with None and drop extra values, so positions are
+        always valid.
+        """
+        if len(row) < self.width:
+            return list(row) + [None] * (self.width - len(row))
+        return row[:self.width]
+
+    def _compile(self, plain, nested):
+        """
+        Build the :meth:`document` function of this layout, with everything
+        known from the header (positions, getters) bound as local variables.
+        """
+        width, fit, enrich, classify = self.width, self.fit, utils.enrich, enrichment.classify
+        normalized_units = enrichment.normalized_units
+        keys = tuple(name for name, _ in plain)
+        positions = [position for _, position in plain]
+        # None in the usual case: plain columns first, tags last
+        values = None if positions == list(range(len(positions))) else _getter(positions)
+        groups = tuple((key, tuple(subkey for subkey, _ in columns), _getter([position for _, position in columns]))
+                       for key, columns in sorted(nested.items(), key=lambda item: item[1][0][1]))
+        classified = [self.index.get(name) for name in CLASSIFY_COLUMNS]
+        classify_values = None if None in classified else _getter(classified)
+        quantity = self.index.get('UsageQuantity')
+
+        def document(row):
+            """
+            Build the enriched output document of a row (see
+            :func:`~awsdbrparser.utils.pre_process`).
+
+            :rtype: dict
+            """
+            if len(row) != width:
+                row = fit(row)
+            document = dict(zip(keys, row if values is None else values(row)))
+            for key, subkeys, group in groups:
+                document[key] = dict(zip(subkeys, group(row)))
+            if classify_values is None:
+                return enrich(document)
+            derived = classify(*classify_values(row))
+            document.update(derived)
+            factor = derived.get('NormalizationFactor')
+            if factor is not None:
+                document['NormalizedUnits'] = normalized_units(factor, row[quantity] if quantity is not None else None)
+            return document
+        return document
+
+    def record(self, row):
+        return Record(self, row)
+
+    def control_filter(self, rules):
+        """
+        Compile the control message rules (``Config.bulk_msg``, a dict of
+        column name to the values marking a row as control message) into a
+        function telling whether a row of this layout is a control message.
+        Each rule is a single column position and value set lookup.
+        """
+        checks = tuple((self.index[name], frozenset(values)) for name, values in rules.items()
+                       if name in self.index)
+        if not checks:
+            return lambda row: False
+        if len(checks) == 1:
+            # the usual case (RecordType)
+            position, values = checks[0]
+            return lambda row: len(row) > position and row[position] in values
+
+        def is_control(row):
+            for position, values in checks:
+                if len(row) > position and row[position] in values:
+                    return True
+            return False
+        return is_control
+
+
+class Record(object):
+    """
+    Read-only, dict like view of a row resolved against its :class:`Layout`,
+    for code that needs a few columns of a row without building a document.
+    """
+
+    __slots__ = ('layout', 'row')
+
+    def __init__(self, layout, row):
+        self.layout = layout
+        self.row = row
+
+    def __getitem__(self, name):
+        position = self.layout.index[name]
+        return self.row[position] if position < len(self.row) else None
+
+    def __contains__(self, name):
+        return name in self.layout.index
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self.layout.index)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/s3.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Streams DBR files straight from S3 (``-i s3://bucket/key``) so parsing starts
+as soon as the first part arrives instead of after a full download.
+"""
+import gzip
+import io
+import threading
+
+from .utils import PY2
+
+S3_SCHEME = 's3://'
+
+
+def is_s3_url(name):
+    return bool(name) and name.startswith(S3_SCHEME)
+
+
+def split_s3_url(url):
+    """
+    Split an ``s3://bucket/key`` URL into its bucket and key.
+
+    .. sourcecode:: python
+
+        >>> split_s3_url('s3://bucket-123456/path/to/dbr.csv')
+        ('bucket-123456', 'path/to/dbr.csv')
+
+    :rtype: tuple
+    """
+    bucket, _, key = url[len(S3_SCHEME):].partition('/')
+    if not bucket or not key:
+        raise ValueError('Invalid S3 URL: {!r}'.format(url))
+    return bucket, key
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Read-only raw stream over an S3 object. The object is split in parts of
+    ``part_size`` bytes, fetched with ranged ``GetObject`` requests by
+    ``concurrency`` worker threads and handed to the reader in order. At most
+    ``read_ahead`` parts are fetched (or being fetched) ahead of the reader,
+    which bounds memory usage to about ``read_ahead * part_size`` bytes.
+
+    The parts are requested with the ``ETag`` of the object when it was
+    opened, so an object overwritten while it is read (e.g. a month-to-date
+    DBR) fails with a ``PreconditionFailed`` error instead of mixing versions.
+    """
+
+    def __init__(self, client, bucket, key, part_size, concurrency, read_ahead):
+        super(S3RangeReader, self).__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        head = client.head_object(Bucket=bucket, Key=key)
+        self.size = head['ContentLength']
+        self.etag = head['ETag']
+        self.parts = (self.size + part_size - 1) // part_size
+        self._results = {}
+        self._error = None
+        self._stopped = False
+        self._next_fetch = 0
+        self._next_read = 0
+        self._position = 0
+        self._current = memoryview(b'')
+        self._cond = threading.Condition()
+        self._window = threading.Semaphore(max(read_ahead, 1))
+        self._workers = []
+        for n in range(min(concurrency, self.parts)):
+            worker = threading.Thread(target=self._fetch_parts, name='dbrparser-s3-{}'.format(n))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if not len(self._current):
+            if self._next_read >= self.parts:
+                return 0
+            with self._cond:
+                while self._next_read not in self._results and self._error is None:
+                    self._cond.wait()
+                if self._error is not None:
+                    raise self._error
+                self._current = memoryview(self._results.pop(self._next_read))
+            self._next_read += 1
+            # a part was consumed, let the workers fetch one more
+            self._window.release()
+        size = min(len(b), len(self._current))
+        b[:size] = self._current[:size]
+        self._current = self._current[size:]
+        self._position += size
+        return size
+
+    def tell(self):
+        # bytes handed to the reader so far (the stream is not seekable)
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            with self._cond:
+                self._stopped = True
+            for _ in self._workers:
+                self._window.release()
+        super(S3RangeReader, self).close()
+
+    def _fetch_parts(self):
+        while True:
+            self._window.acquire()
+            with self._cond:
+                if self._stopped or self._error is not None or self._next_fetch >= self.parts:
+                    # pass the permit on so the other workers can finish as well
+                    self._window.release()
+                    return
+                index = self._next_fetch
+                self._next_fetch += 1
+            start = index * self.part_size
+            end = min(start + self.part_size, self.size) - 1
+            try:
+                response = self.client.get_object(Bucket=self.bucket, Key=self.key, IfMatch=self.etag,
+                                                  Range='bytes={:d}-{:d}'.format(start, end))
+                data = response['Body'].read()
+            except Exception as e:
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._results[index] = data
+                self._cond.notify_all()
+
+
+class _GzipStream(gzip.GzipFile):
+    """GzipFile that also closes the stream it decompresses."""
+
+    def close(self):
+        fileobj = self.fileobj
+        super(_GzipStream, self).close()
+        if fileobj is not None:
+            fileobj.close()
+
+
+def s3_client(config):
+    import boto3
+
+    return boto3.client('s3', endpoint_url=config.s3_endpoint_url)
+
+
+def open_s3(config, url, client=None):
+    """
+    Open the S3 object at ``url`` as a text stream (a binary one on Python 2)
+    suitable for :class:`csv.reader`. Objects whose key ends with ``.gz`` are
+    decompressed on the fly.
+    """
+    bucket, key = split_s3_url(url)
+    raw = S3RangeReader(client or s3_client(config), bucket, key,
+                        part_size=config.s3_part_size,
+                        concurrency=config.s3_concurrency,
+                        read_ahead=config.s3_read_ahead)
+    stream = io.BufferedReader(raw, buffer_size=io.DEFAULT_BUFFER_SIZE * 16)
+    if key.endswith('.gz'):
+        stream = _GzipStream(fileobj=stream, mode='rb')
+    if PY2:
+        return stream
+    return io.TextIOWrapper(stream, encoding=config.encoding, newline='')
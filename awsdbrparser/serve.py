@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/serve.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Long running mode (``dbrparser serve``): watches local directories and/or S3
+prefixes for new or updated DBR files and parses them through a work queue,
+keeping Elasticsearch clients, AWS credentials and prepared indices between
+jobs. Files whose content did not change since they were last processed are
+skipped.
+"""
+import copy
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+from . import parser
+from . import s3
+from . import utils
+from .config import OUTPUT_EXTENSIONS
+
+WATCH_INTERVAL = 60
+SERVE_CONCURRENCY = 2
+
+PATTERNS = ('*.csv', '*.csv.gz')
+"""
+Names of the files picked up in watched directories and S3 prefixes.
+"""
+
+SETTLE_TIME = 10
+"""
+Local files modified less than this many seconds ago are considered still
+being written and are left for the next scan.
+"""
+
+DBR_FILENAME = re.compile(r'(?P<account>\d{12})-aws-billing-.*-(?P<year>\d{4})-(?P<month>\d{2})\.csv')
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def config_for(config, source, output_dir=None):
+    """
+    Copy of ``config`` for parsing ``source``; the account id, year and month
+    are taken from the standard DBR file name when it matches, and file
+    outputs are named after the source inside ``output_dir``.
+    """
+    job = copy.copy(config)
+    job.input_filename = source
+    name = os.path.basename(source)
+    match = DBR_FILENAME.search(name)
+    if match:
+        job.account_id = match.group('account')
+        job.es_year = int(match.group('year'))
+        job.es_month = int(match.group('month'))
+    if output_dir is not None:
+        stem = name[:-len('.gz')] if name.endswith('.gz') else name
+        stem = os.path.splitext(stem)[0]
+        job.output_filename = os.path.join(output_dir, stem + OUTPUT_EXTENSIONS.get(job.output_type, ''))
+    return job
+
+
+def file_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Watcher(object):
+    """
+    Scans the watched locations and returns the files whose content changed
+    since they were last marked as processed. Local files are hashed only when
+    their size or modification time changed; S3 objects are compared by ETag.
+    The processed state is kept in ``state_file`` (when given) so restarts
+    don't reprocess unchanged files.
+    """
+
+    def __init__(self, locations, state_file=None, s3_client=None):
+        self.locations = locations
+        self.state_file = state_file
+        self.s3_client = s3_client
+        self._lock = threading.Lock()
+        self._state = {}
+        self._stats = {}
+        if state_file and os.path.isfile(state_file):
+            with open(state_file) as f:
+                self._state = json.load(f)
+
+    def changed(self):
+        """
+        :returns: list of ``(source, content_hash)`` tuples.
+        """
+        changed = []
+        for location in self.locations:
+            if s3.is_s3_url(location):
+                candidates = self._scan_s3(location)
+            else:
+                candidates = self._scan_directory(location)
+            for source, content_hash in candidates:
+                with self._lock:
+                    if self._state.get(source) != content_hash:
+                        changed.append((source, content_hash))
+        return changed
+
+    def mark(self, source, content_hash):
+        with self._lock:
+            self._state[source] = content_hash
+            if self.state_file:
+                temp = self.state_file + '.tmp'
+                with open(temp, 'w') as f:
+                    json.dump(self._state, f, indent=2, sort_keys=True)
+                os.rename(temp, self.state_file)
+
+    def _scan_directory(self, directory):
+        now = time.time()
+        for name in sorted(os.listdir(directory)):
+            filename = os.path.join(directory, name)
+            if not os.path.isfile(filename) or not _matches(name):
+                continue
+            stat = os.stat(filename)
+            if now - stat.st_mtime < SETTLE_TIME:
+                continue
+            key = (stat.st_size, stat.st_mtime)
+            cached = self._stats.get(filename)
+            if cached and cached[0] == key:
+                content_hash = cached[1]
+            else:
+                content_hash = file_hash(filename)
+                self._stats[filename] = (key, content_hash)
+            yield filename, content_hash
+
+    def _scan_s3(self, url):
+        bucket, _, prefix = url[len(s3.S3_SCHEME):].partition('/')
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for item in page.get('Contents', []):
+                if _matches(item['Key'].rsplit('/', 1)[-1]):
+                    yield 's3://{}/{}'.format(bucket, item['Key']), item['ETag'].strip('"')
+
+
+def _matches(name):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in PATTERNS)
+
+
+class WarmSinks(object):
+    """
+    Opens the sinks for the serve jobs, reusing one Elasticsearch client per
+    endpoint (also used by the analytics and the bulk load tuning of the
+    jobs, see :meth:`client`) and one event loop for the async sinks, and
+    creating the index / putting the mapping only the first time an index is
+    used (or every time, when ``delete_index`` is set).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._prepared = set()
+        self._loop = None
+
+    def client(self, config):
+        """
+        The Elasticsearch client of the configured endpoint, created on first
+        use.
+        """
+        key = _endpoint(config)
+        with self._lock:
+            es = self._clients.get(key)
+            if es is None:
+                es = self._clients[key] = parser.elasticsearch_client(config)
+        return es
+
+    def open(self, config, echo):
+        if not config.output_to_elasticsearch:
+            return parser.open_sink(config, echo)
+        key = _endpoint(config)
+        es = self.client(config)
+        with self._lock:
+            if config.delete_index or (key, config.index_name) not in self._prepared:
+                parser.prepare_index(es, config, echo)
+                self._prepared.add((key, config.index_name))
+            if config.es_async and self._loop is None:
+                from . import aio
+
+                self._loop = aio.EventLoop()
+        return parser.elasticsearch_sink(es, config, echo, loop=self._loop)
+
+    def close(self):
+        with self._lock:
+            if self._loop is not None:
+                self._loop.close()
+                self._loop = None
+
+
+def _endpoint(config):
+    return config.es_host, config.es_port, config.es_timeout, config.awsauth
+
+
+def serve(config, locations, concurrency=SERVE_CONCURRENCY, interval=WATCH_INTERVAL,
+          state_file=None, once=False, verbose=False, output_dir=None):
+    """
+    Watch ``locations`` (local directories or ``s3://bucket/prefix`` URLs)
+    and parse new or updated DBR files with ``concurrency`` worker threads.
+    With ``once`` a single scan is processed and the function returns. File
+    outputs are written to ``output_dir`` (see :func:`config_for`).
+
+    :param config: An instance of :class:`~awsdbrparser.config.Config` class,
+        used as template for every job.
+    :returns: dict mapping each processed source to its ``Summary`` (or the
+        exception raised while parsing it).
+    """
+    echo = utils.ClickEchoWrapper(quiet=(not verbose))
+    if output_dir is not None and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    s3_client = s3.s3_client(config) if any(s3.is_s3_url(location) for location in locations) else None
+    watcher = Watcher(locations, state_file=state_file, s3_client=s3_client)
+    warm_sinks = WarmSinks()
+    jobs = queue.Queue()
+    pending = set()
+    pending_lock = threading.Lock()
+    results = {}
+
+    def work():
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            source, content_hash = job
+            job_config = config_for(config, source, output_dir)
+            echo('Processing {}'.format(source))
+            try:
+                start = time.time()
+                sink = warm_sinks.open(job_config, echo)
+                uses_es = job_config.output_to_elasticsearch or job_config.analytics
+                summary = parser.parse(job_config, sink=sink, es=warm_sinks.client(job_config) if uses_es else None)
+                watcher.mark(source, content_hash)
+                results[source] = summary
+                echo('Finished {}: {} added, {} control messages in {:.1f}s'.format(
+                    source, summary.added, summary.control_messages, time.time() - start))
+            except Exception as e:
+                results[source] = e
+                echo('Failed to process {}: {!r}'.format(source, e), err=True)
+            finally:
+                with pending_lock:
+                    pending.discard(source)
+                jobs.task_done()
+
+    workers = [threading.Thread(target=work, name='dbrparser-serve-{}'.format(n)) for n in range(concurrency)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    try:
+        while True:
+            for source, content_hash in watcher.changed():
+                with pending_lock:
+                    if source in pending:
+                        continue
+                    pending.add(source)
+                jobs.put((source, content_hash))
+            if once:
+                jobs.join()
+                break
+            time.sleep(interval)
+    finally:
+        for _ in workers:
+            jobs.put(None)
+        if once:
+            # the workers finish the queued jobs before the event loop is closed
+            for worker in workers:
+                worker.join()
+            warm_sinks.close()
+    return results
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/sinks.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Destinations for the enriched documents produced by
+:func:`~awsdbrparser.parser.iter_documents`. Documents can be consumed
+directly from that generator, or handed to a sink that receives them in
+batches, for example to send them to a message queue or a warehouse loader:
+
+.. sourcecode:: python
+
+    from awsdbrparser.config import Config
+    from awsdbrparser.parser import iter_documents, parse
+    from awsdbrparser.sinks import Sink
+
+    class KafkaSink(Sink):
+        def __init__(self, producer, topic):
+            super(KafkaSink, self).__init__()
+            self.producer = producer
+            self.topic = topic
+
+        def write_many(self, documents):
+            for document in documents:
+                self.producer.send(self.topic, document)
+                self.added += 1
+
+        def flush(self):
+            self.producer.flush()
+
+    config = Config()
+    config.input_filename = 'dbr.csv'
+
+    for document in iter_documents(config):
+        print(document['UsageStartDate'], document['UsageItem'])
+
+    summary = parse(config, sink=KafkaSink(producer, 'billing'))
+"""
+import json
+
+from . import encoders
+from . import utils
+from .utils import ParserError
+
+
+class Sink(object):
+    """
+    Base class for document sinks. Subclasses implement :meth:`write_many`
+    and keep the ``added``, ``skipped`` and ``updated`` counters that end up in
+    the :class:`~awsdbrparser.parser.Summary` of a parse.
+
+    Sinks encoding the documents with the configured JSON encoder set
+    ``encodes``; the encoder then prints them in debug mode, otherwise
+    :func:`~awsdbrparser.parser.parse` does.
+    """
+
+    encodes = False
+
+    def __init__(self):
+        self.added = 0
+        self.skipped = 0
+        self.updated = 0
+
+    def write_many(self, documents):
+        """
+        Write a batch (list) of enriched documents.
+        """
+        raise NotImplementedError()
+
+    def flush(self):
+        """
+        Push any buffered documents to the destination.
+        """
+
+    def close(self):
+        """
+        Flush and release the resources held by the sink.
+        """
+        self.flush()
+
+
+class WriterSink(Sink):
+    """
+    Sink for the file outputs: JSON (:mod:`awsdbrparser.writers`), Parquet
+    (:mod:`awsdbrparser.parquet`) and Elasticsearch bulk files.
+    """
+
+    def __init__(self, writer, encodes=False):
+        super(WriterSink, self).__init__()
+        self.writer = writer
+        self.encodes = encodes
+
+    @property
+    def filenames(self):
+        return self.writer.filenames
+
+    def write_many(self, documents):
+        write = self.writer.write
+        for document in documents:
+            write(document)
+        self.added += len(documents)
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+
+class ElasticsearchBulkSink(Sink):
+    """
+    Sends each batch of documents to Elasticsearch through the bulk API. The
+    request body is assembled from the encoded documents as they are, so
+    every document is serialized exactly once.
+    """
+
+    encodes = True
+
+    def __init__(self, es, config, echo=None):
+        super(ElasticsearchBulkSink, self).__init__()
+        self.es = es
+        self.config = config
+        self.echo = echo or utils.ClickEchoWrapper(quiet=True)
+        self.dumps = encoders.encoder_for(config.json_encoder, debug=config.debug)
+        action = {'index': {'_index': config.index_name, '_type': config.es_doctype}}
+        self._action = json.dumps(action).encode('utf-8') + b'\n'
+        self._recno = 0
+
+    def write_many(self, documents):
+        if not documents:
+            return
+        action, dumps = self._action, self.dumps
+        body = b''.join([action + dumps(document) + b'\n' for document in documents])
+        response = self.es.bulk(body=body)
+        for item in response.get('items', []):
+            # <item> a dictionary like this one:
+            #
+            #   {
+            #       'index': {
+            #           'status': 201,
+            #           '_type': 'billing',
+            #           '_shards': {
+            #               'successful': 1,
+            #               'failed': 0,
+            #               'total': 2
+            #           },
+            #           '_index': 'billing-2015-12',
+            #           '_version': 1,
+            #           '_id': u'AVOmiEdSF_o3S6_4Qeur'
+            #       }
+            #   }
+            #
+            result = list(item.values())[0]
+            if not 200 <= result.get('status', 500) < 300:
+                message = 'Failed to index record {:d} with result: {!r}'.format(self._recno, item)
+                if self.config.fail_fast:
+                    raise ParserError(message)
+                else:
+                    self.echo(message, err=True)
+            else:
+                self.added += 1
+            self._recno += 1
+
+
+class ElasticsearchLineSink(Sink):
+    """
+    Sends documents to Elasticsearch one index request at a time, optionally
+    checking whether the record already exists (see ``Config.check``).
+    """
+
+    encodes = True
+
+    def __init__(self, es, config, echo=None):
+        super(ElasticsearchLineSink, self).__init__()
+        self.es = es
+        self.config = config
+        self.echo = echo or utils.ClickEchoWrapper(quiet=True)
+        self.dumps = encoders.encoder_for(config.json_encoder, debug=config.debug)
+        self._recno = 0
+
+    def write_many(self, documents):
+        for document in documents:
+            self._write(document)
+            self._recno += 1
+
+    def _write(self, document):
+        es, config = self.es, self.config
+        if config.check:
+            # FIXME: the way it was, `search_exists` will not suffice, since we'll need the document _id for the update operation; # noqa
+            # FIXME: use `es.search` with the following sample body: `{'query': {'match': {'RecordId': '43347302922535274380046564'}}}`; # noqa
+            # SEE: https://elasticsearch-py.readthedocs.org/en/master/api.html#elasticsearch.Elasticsearch.search; # noqa
+            response = es.search_exists(index=config.es_doctype, doc_type=config.es_doctype,
+                                        q='RecordId:{}'.format(document['RecordId']))
+            if response:
+                # TODO: when config.update is set, requires _id from the existing document
+                # FIXME: requires use of `es.search` method instead of `es.search_exists`
+                # SEE: https://elasticsearch-py.readthedocs.org/en/master/api.html#elasticsearch.Elasticsearch.update; # noqa
+                self.skipped += 1
+                return
+
+        response = es.index(index=config.es_doctype, doc_type=config.es_doctype,
+                            body=self.dumps(document))
+        if not es_index_successful(response):
+            message = 'Failed to index record {:d} with result {!r}'.format(self._recno, response)
+            if config.fail_fast:
+                raise ParserError(message)
+            else:
+                self.echo(message, err=True)
+        else:
+            self.added += 1
+
+
+def es_index_successful(response):
+    """
+    Test if an Elasticsearch client ``index`` method response indicates a
+    successful index operation. The response parameter should be a dictionary
+    with following keys:
+
+    .. sourcecode:: python
+
+        {
+            '_shards': {
+                'total': 2,
+                'failed': 0,
+                'successful': 1
+            },
+            '_index': u'billing-2015-12',
+            '_type': u'billing',
+            '_id': u'AVOmKFXgF_o3S6_4PkP1',
+            '_version': 1,
+            'created': True
+        }
+
+    According to `Elasticsearch Index API <https://www.elastic.co/guide/en/
+    elasticsearch/reference/current/docs-index_.html>`, an index operation is
+    successful in the case ``successful`` is at least 1.
+
+    :rtype: bool
+    """
+    return response.get('_shards', {}).get('successful', 0) >= 1
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/sketches.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Streaming sketches used by the analytics to summarize per day resource usage
+in bounded memory, whatever the number of distinct ``ResourceId`` values:
+
+* :class:`SpaceSaving` keeps the most expensive resources (heavy hitters);
+* :class:`HyperLogLog` estimates the number of distinct resources.
+
+Both are mergeable, so sketches built over parts of the line items (e.g. by
+several workers or successive runs) can be combined into the sketch of the
+whole, and can be saved as JSON compatible dicts (``to_dict``/``from_dict``).
+"""
+import base64
+import hashlib
+import heapq
+import math
+import struct
+
+HEAP_SLACK = 4
+"""
+The :class:`SpaceSaving` heap is rebuilt when it holds more than this many
+(mostly outdated) entries per counter.
+"""
+
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+
+
+class SpaceSaving(object):
+    """
+    Weighted Space-Saving heavy hitters summary with ``capacity`` counters.
+    Every reported count over-estimates the true weight of its item by at
+    most the reported error, which is bounded by ``total / capacity``.
+    Weights must be positive.
+    """
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError('Invalid Space-Saving capacity: {!r}'.format(capacity))
+        self.capacity = capacity
+        self.total = 0.0
+        self.counts = {}
+        self.errors = {}
+        self._heap = []
+
+    @classmethod
+    def for_error(cls, error, size=1):
+        """
+        Summary whose counts are within ``error`` times the total weight,
+        able to report at least ``size`` items.
+        """
+        return cls(max(int(math.ceil(1.0 / error)), size))
+
+    def add(self, item, weight=1.0):
+        self.total += weight
+        counts = self.counts
+        if item in counts:
+            counts[item] += weight
+        elif len(counts) < self.capacity:
+            counts[item] = weight
+            self.errors[item] = 0.0
+        else:
+            # replace the item with the smallest count, which becomes the error
+            victim, minimum = self._pop_min()
+            del counts[victim]
+            del self.errors[victim]
+            counts[item] = minimum + weight
+            self.errors[item] = minimum
+        heapq.heappush(self._heap, (counts[item], item))
+        if len(self._heap) > HEAP_SLACK * self.capacity:
+            self._rebuild_heap()
+
+    def merge(self, other):
+        """
+        Add the items summarized by ``other`` (a :class:`SpaceSaving` of any
+        capacity) to this summary.
+        """
+        floor, other_floor = self._floor(), other._floor()
+        counts, errors = {}, {}
+        for item in set(self.counts) | set(other.counts):
+            counts[item] = self.counts.get(item, floor) + other.counts.get(item, other_floor)
+            errors[item] = self.errors.get(item, floor) + other.errors.get(item, other_floor)
+        keep = heapq.nlargest(self.capacity, counts, key=counts.get)
+        self.counts = dict((item, counts[item]) for item in keep)
+        self.errors = dict((item, errors[item]) for item in keep)
+        self.total += other.total
+        self._rebuild_heap()
+
+    def top(self, size):
+        """
+        :returns: list of up to ``size`` ``(item, count, error)`` tuples, the
+            largest count first.
+        """
+        items = heapq.nlargest(size, self.counts, key=self.counts.get)
+        return [(item, self.counts[item], self.errors[item]) for item in items]
+
+    def to_dict(self):
+        return {'capacity': self.capacity,
+                'total': self.total,
+                'counters': [[item, count, self.errors[item]] for item, count in self.counts.items()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls(data['capacity'])
+        summary.total = data['total']
+        for item, count, error in data['counters']:
+            summary.counts[item] = count
+            summary.errors[item] = error
+        summary._rebuild_heap()
+        return summary
+
+    def _floor(self):
+        # weight an item left out of a full summary may have
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0.0
+
+    def _pop_min(self):
+        while True:
+            count, item = heapq.heappop(self._heap)
+            # skip entries left behind by later increments or evictions
+            if self.counts.get(item) == count:
+                return item, count
+
+    def _rebuild_heap(self):
+        self._heap = [(count, item) for item, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+
+def _hash64(item):
+    if not isinstance(item, bytes):
+        item = item.encode('utf-8')
+    return struct.unpack('>Q', hashlib.sha1(item).digest()[:8])[0]
+
+
+class HyperLogLog(object):
+    """
+    HyperLogLog distinct count estimator with ``2 ** precision`` one byte
+    registers. The relative standard error is ``1.04 / sqrt(2 ** precision)``.
+    """
+
+    def __init__(self, precision):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError('Invalid HyperLogLog precision: {!r}'.format(precision))
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    @classmethod
+    def for_error(cls, error):
+        """
+        Estimator with a relative standard error of at most ``error`` (within
+        the supported precisions).
+        """
+        precision = int(math.ceil(math.log((1.04 / error) ** 2, 2)))
+        return cls(min(max(precision, MIN_PRECISION), MAX_PRECISION))
+
+    def add(self, item):
+        value = _hash64(item)
+        bits = 64 - self.precision
+        index = value >> bits
+        rank = bits - (value & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge HyperLogLog of precision {} into {}'.format(
+                other.precision, self.precision))
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def to_dict(self):
+        return {'precision': self.precision,
+                'registers': base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data):
+        estimator = cls(data['precision'])
+        registers = bytearray(base64.b64decode(data['registers']))
+        if len(registers) != len(estimator.registers):
+            raise ValueError('Invalid HyperLogLog registers for precision {}'.format(data['precision']))
+        estimator.registers = registers
+        return estimator
+
+    def count(self):
+        size = len(self.registers)
+        if size >= 128:
+            alpha = 0.7213 / (1 + 1.079 / size)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[size]
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(b'\0')
+        if estimate <= 2.5 * size and zeros:
+            # small range correction (linear counting)
+            estimate = size * math.log(float(size) / zeros)
+        return int(round(estimate))
+
+
+def line_item_cost(document):
+    # single account DBRs have Cost, consolidated ones (Un)BlendedCost
+    try:
+        return float(document.get('Cost') or document.get('UnBlendedCost') or 0.0)
+    except ValueError:
+        return 0.0
+
+
+class ResourceStats(object):
+    """
+    Per day summaries of the line items resources: the ``top_size`` most
+    expensive resources (counts within ``top_error`` times the day cost) and
+    the number of distinct resources per product (within ``distinct_error``
+    relative error). Memory usage depends on the number of days and products,
+    not on the number of resources.
+    """
+
+    def __init__(self, top_size, top_error, distinct_error):
+        self.top_size = top_size
+        self.top_error = top_error
+        self.distinct_error = distinct_error
+        self.top = {}
+        self.distinct = {}
+
+    def add(self, document):
+        resource = document.get('ResourceId')
+        day = (document.get('UsageStartDate') or '')[:10]
+        if not resource or not day:
+            return
+        if self.top_size:
+            cost = line_item_cost(document)
+            if cost > 0:
+                top = self.top.get(day)
+                if top is None:
+                    top = self.top[day] = SpaceSaving.for_error(self.top_error, self.top_size)
+                top.add(resource, cost)
+        key = (day, document.get('ProductName') or '')
+        distinct = self.distinct.get(key)
+        if distinct is None:
+            distinct = self.distinct[key] = HyperLogLog.for_error(self.distinct_error)
+        distinct.add(resource)
+
+    def merge(self, other):
+        for day, top in other.top.items():
+            if day in self.top:
+                self.top[day].merge(top)
+            else:
+                self.top[day] = top
+        for key, distinct in other.distinct.items():
+            if key in self.distinct:
+                self.distinct[key].merge(distinct)
+            else:
+                self.distinct[key] = distinct
+
+    def to_dict(self):
+        return {'top_size': self.top_size,
+                'top_error': self.top_error,
+                'distinct_error': self.distinct_error,
+                'top': dict((day, top.to_dict()) for day, top in self.top.items()),
+                'distinct': [[day, product, distinct.to_dict()]
+                             for (day, product), distinct in self.distinct.items()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data['top_size'], data['top_error'], data['distinct_error'])
+        stats.top = dict((day, SpaceSaving.from_dict(top)) for day, top in data['top'].items())
+        stats.distinct = dict(((day, product), HyperLogLog.from_dict(distinct))
+                              for day, product, distinct in data['distinct'])
+        return stats
+
+    def top_documents(self, days=None):
+        """
+        Yield one ``top_resources`` document per day and resource, only for
+        the given ``days`` (``'2016-03-01'``, ...) when not None.
+        """
+        for day in sorted(self.top):
+            if days is not None and day not in days:
+                continue
+            summary = self.top[day]
+            for rank, (resource, cost, error) in enumerate(summary.top(self.top_size), 1):
+                yield {'UsageStartDate': day + ' 12:00:00',
+                       'Rank': rank,
+                       'ResourceId': resource,
+                       'Cost': cost,
+                       'CostError': error,
+                       'DayCost': summary.total}
+
+    def distinct_documents(self, days=None):
+        """
+        Yield one ``distinct_resources`` document per day and product, only
+        for the given ``days`` when not None.
+        """
+        for (day, product) in sorted(self.distinct):
+            if days is not None and day not in days:
+                continue
+            yield {'UsageStartDate': day + ' 12:00:00',
+                   'ProductName': product,
+                   'DistinctResources': self.distinct[(day, product)].count()}
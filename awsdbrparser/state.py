@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/state.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Persistent analytics state (``--analytics-state FILE``) for incremental BI
+over month-to-date DBR files.
+
+The state of an account and month holds everything the analytics documents
+are computed from: the hourly EC2 usage (counts, cost sums, RI and Spot
+tallies, from which the daily totals and the per hour min/max used for the
+elasticity are derived) and the resource sketches. It also remembers how
+many records of the DBR have been folded in and a digest of the last line
+item, so a later run over the grown file only folds the new rows in and
+re-emits the documents of the days they touched.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from . import sketches
+
+STATE_VERSION = 1
+
+_lock = threading.Lock()
+
+
+def state_key(config):
+    """
+    Key of the configured account and month in the state file.
+    """
+    return '{}-{:04d}-{:02d}'.format(config.account_id, config.es_year, config.es_month)
+
+
+def document_digest(document):
+    return hashlib.sha1(json.dumps(document, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def is_ec2_usage(document):
+    if document.get('ProductName') != 'Amazon Elastic Compute Cloud':
+        return False
+    return 'RunInstances' in document.get('Operation') and document.get('UsageItem')
+
+
+class AnalyticsState(object):
+    """
+    Mergeable analytics accumulators of the line items read so far.
+
+    ``hourly`` maps the hours (``'2016-03-01 01:00:00'``) to their EC2 usage
+    (see :func:`awsdbrparser.aggregations.hourly_usage`), ``resources`` is a
+    :class:`~awsdbrparser.sketches.ResourceStats`, ``records`` the number of
+    DBR records up to the last line item added and ``digest`` the
+    :func:`document_digest` of that line item.
+    """
+
+    def __init__(self, config):
+        self.settings = settings(config)
+        self.hourly = {}
+        self.resources = sketches.ResourceStats(config.analytics_top_resources, config.analytics_top_error,
+                                                config.analytics_distinct_error)
+        self.records = 0
+        self.digest = None
+        self._last = None
+
+    def add(self, document, record):
+        """
+        Fold in a line item, read as the ``record``-th DBR record.
+
+        :returns: the day (``'2016-03-01'``) of the line item.
+        """
+        self.resources.add(document)
+        daytime = document.get('UsageStartDate') or ''
+        if is_ec2_usage(document):
+            hour = self.hourly.setdefault(daytime, {"Count": 0, "Cost": 0.00, "RI": 0, "Spot": 0, "Unblended": 0.00})
+            hour["Count"] += 1
+            hour["Unblended"] += float(document.get('UnBlendedCost', 0.00))
+            hour["Cost"] += float(document.get('Cost', 0.00))
+            if document.get('UsageItem') == 'Reserved Instance':
+                hour["RI"] += 1
+            elif document.get('UsageItem') == 'Spot Instance':
+                hour["Spot"] += 1
+        self.records = record
+        self._last = document
+        return daytime.split(' ')[0]
+
+    def merge(self, other):
+        """
+        Add the line items accumulated by ``other`` (e.g. another file of the
+        same account and month).
+        """
+        for daytime, usage in other.hourly.items():
+            hour = self.hourly.setdefault(daytime, {"Count": 0, "Cost": 0.00, "RI": 0, "Spot": 0, "Unblended": 0.00})
+            for name, value in usage.items():
+                hour[name] += value
+        self.resources.merge(other.resources)
+
+    def to_dict(self):
+        if self._last is not None:
+            self.digest = document_digest(self._last)
+        return {'version': STATE_VERSION,
+                'settings': self.settings,
+                'records': self.records,
+                'digest': self.digest,
+                'hourly': self.hourly,
+                'resources': self.resources.to_dict()}
+
+    @classmethod
+    def from_dict(cls, config, data):
+        state = cls(config)
+        state.records = data['records']
+        state.digest = data['digest']
+        state.hourly = data['hourly']
+        state.resources = sketches.ResourceStats.from_dict(data['resources'])
+        return state
+
+
+def settings(config):
+    # a state computed with other sketch parameters can't be resumed
+    return {'top_resources': config.analytics_top_resources,
+            'top_error': config.analytics_top_error,
+            'distinct_error': config.analytics_distinct_error}
+
+
+def load(filename, config):
+    """
+    Load the state of the configured account and month from ``filename``.
+
+    :returns: the saved :class:`AnalyticsState`, or a new one when there is
+        none or it was computed with other settings.
+    """
+    with _lock:
+        states = _read(filename)
+    data = states.get(state_key(config))
+    if not data or data.get('version') != STATE_VERSION or data.get('settings') != settings(config):
+        return AnalyticsState(config)
+    return AnalyticsState.from_dict(config, data)
+
+
+def save(filename, config, state):
+    """
+    Save the state of the configured account and month to ``filename``,
+    keeping the other accounts and months saved there.
+    """
+    with _lock:
+        states = _read(filename)
+        states[state_key(config)] = state.to_dict()
+        temp = filename + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(states, f, sort_keys=True)
+        os.rename(temp, filename)
+
+
+def _read(filename):
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/tuning.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Index settings for bulk loads (``--bulk-load``). While documents are loaded,
+the target indices are not refreshed and have no replicas, which roughly
+doubles the indexing throughput. The original settings are restored and the
+indices refreshed when the load ends, even on errors or Ctrl-C; after a
+successful load the indices can be force merged as well (``--force-merge``).
+
+Loads running in the same process share the tuning of an index (e.g. the BI
+thread writing to the line items index on Elasticsearch 2.x, or concurrent
+``serve`` workers): the settings are restored when the last of them ends.
+Settings of a process killed during a load are not restored.
+"""
+import contextlib
+import threading
+
+BULK_LOAD_SETTINGS = {'refresh_interval': '-1', 'number_of_replicas': 0}
+"""
+Index settings applied during a bulk load.
+"""
+
+DEFAULT_REFRESH_INTERVAL = '1s'
+"""
+Restored when the index had no explicit refresh interval.
+"""
+
+FORCE_MERGE_SEGMENTS = 1
+FORCE_MERGE_TIMEOUT = 3600
+
+_lock = threading.Lock()
+_loading = {}
+
+
+class _Tuning(object):
+    # bulk load state of an index: the loads using it and the settings to restore
+    def __init__(self):
+        self.lock = threading.Lock()  # held while the settings of the index change
+        self.users = 0
+        self.original = None  # None while the index is not tuned
+
+
+@contextlib.contextmanager
+def bulk_load(es, indices, force_merge=False, echo=None):
+    """
+    Context manager tuning ``indices`` for a bulk load with the
+    :data:`BULK_LOAD_SETTINGS` and restoring their settings at exit. Does
+    nothing when ``indices`` is empty.
+
+    :param force_merge: force merge the indices when the load succeeded.
+    :raises: the first error restoring an index after a successful load
+        (the error of a failed load is not hidden by them).
+    """
+    acquired = []
+    succeeded = False
+    try:
+        for index in indices:
+            if index not in acquired:
+                _acquire(es, index, echo)
+                acquired.append(index)
+        yield
+        succeeded = True
+    finally:
+        errors = [_release(es, index, force_merge and succeeded, echo) for index in reversed(acquired)]
+    errors = [error for error in errors if error is not None]
+    if errors:
+        raise errors[0]
+
+
+def current_settings(es, index):
+    """
+    The settings of ``index`` changed by a bulk load.
+    """
+    response = es.indices.get_settings(index=index, flat_settings=True)
+    settings = list(response.values())[0]['settings']
+    return {'refresh_interval': settings.get('index.refresh_interval', DEFAULT_REFRESH_INTERVAL),
+            'number_of_replicas': settings.get('index.number_of_replicas')}
+
+
+def _acquire(es, index, echo):
+    # the Elasticsearch calls are made under the lock of the index only
+    with _lock:
+        tuning = _loading.get(index)
+        if tuning is None:
+            tuning = _loading[index] = _Tuning()
+        tuning.users += 1
+    try:
+        with tuning.lock:
+            if tuning.original is not None:
+                return
+            original = current_settings(es, index)
+            if echo:
+                echo('Tuning index {} for bulk load (was {!r})'.format(index, original))
+            es.indices.put_settings(index=index, body={'index': BULK_LOAD_SETTINGS})
+            tuning.original = original
+    except BaseException:
+        with _lock:
+            tuning.users -= 1
+            _forget(index, tuning)
+        raise
+
+
+def _release(es, index, force_merge, echo):
+    # returns the error restoring the index, if any
+    with _lock:
+        tuning = _loading[index]
+        tuning.users -= 1
+        if tuning.users:
+            return None
+    with tuning.lock:
+        try:
+            # a load may have started since, it restores the settings when it ends
+            if tuning.users or tuning.original is None:
+                return None
+            original, tuning.original = tuning.original, None
+            es.indices.put_settings(index=index, body={'index': original})
+            if force_merge:
+                if echo:
+                    echo('Force merging index: {}'.format(index))
+                es.indices.forcemerge(index=index, max_num_segments=FORCE_MERGE_SEGMENTS,
+                                      request_timeout=FORCE_MERGE_TIMEOUT)
+            es.indices.refresh(index=index)
+        except Exception as e:
+            if echo:
+                echo('[!] Unable to restore the settings of index {}: {!r}'.format(index, e), err=True)
+            return e
+        finally:
+            with _lock:
+                _forget(index, tuning)
+        return None
+
+
+def _forget(index, tuning):
+    # called with _lock held
+    if not tuning.users and _loading.get(index) is tuning:
+        del _loading[index]
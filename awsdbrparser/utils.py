@@ -16,11 +16,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import contextlib
+import sys
 
 import click
 
 from . import __version__
+from . import enrichment
+
+PY2 = sys.version_info[0] == 2
+"""
+The csv module of Python 2 reads byte strings, so inputs are opened in binary
+mode there (see :func:`awsdbrparser.parser.open_input`).
+"""
+
+
+class ParserError(Exception):
+    pass
 
 
 def pre_process(json_dict):
@@ -34,7 +45,11 @@ def pre_process(json_dict):
     * Spot
     The result is included in the field: UsageItem
 
-    The instance size is included in the new field: InstanceType
+    The instance size is included in the new field: InstanceType, split in
+    InstanceFamily and InstanceSize, and the region derived from UsageType in
+    the field: Region. For instances of known size the NormalizationFactor and
+    the NormalizedUnits (UsageQuantity times the factor) are included as well.
+    See :func:`awsdbrparser.enrichment.classify` for the rules.
 
     :param dict json_dict:
     :returns: json dict
@@ -49,26 +64,25 @@ def pre_process(json_dict):
         else:
             temp_json.setdefault(key, value)
 
-    temp_json['UsageItem'] = ''
+    return enrich(temp_json)
 
-    if temp_json.get('ProductName') == 'Amazon Elastic Compute Cloud' and 'RunInstances' in temp_json.get('Operation'):
-        # Some lineitems contain strings like: "RunInstances:002".
-        if temp_json.get('ReservedInstance', '') == 'Y':
-            temp_json['UsageItem'] = 'Reserved Instance'
 
-        elif 'BoxUsage' in temp_json.get('UsageType', ' '):
-            # If this LineItem is a EC2 instance running we include 'EC2-Running'
-            temp_json['UsageItem'] = 'On-Demand'
+def enrich(document):
+    """
+    Add the fields derived by :func:`awsdbrparser.enrichment.classify` (and
+    the ``NormalizedUnits``) to a document, in place.
 
-        elif 'SpotUsage' in temp_json.get('UsageType', ' '):
-            temp_json['UsageItem'] = 'Spot Instance'
+    :returns: the document
+    :rtype: dict
+    """
+    document.update(enrichment.classify(document.get('ProductName'), document.get('Operation'),
+                                        document.get('UsageType'), document.get('ReservedInstance')))
 
-        if ':' in temp_json.get('UsageType'):
-            temp_json['InstanceType'] = temp_json.get('UsageType').split(':')[1]
-        else:
-            temp_json['InstanceType'] = 'N/A'
+    factor = document.get('NormalizationFactor')
+    if factor is not None:
+        document['NormalizedUnits'] = enrichment.normalized_units(factor, document.get('UsageQuantity'))
 
-    return temp_json
+    return document
 
 
 def bulk_data(json_string, bulk):
@@ -124,6 +138,27 @@ def hints_for(choices):
     return ', '.join(['{}={}'.format(value, label) for value, label in choices])
 
 
+def parse_hosts(value, default_port):
+    """
+    Parse a comma separated list of ``HOST[:PORT]`` items into the host dicts
+    expected by the Elasticsearch client. For example:
+
+    .. sourcecode:: python
+
+        >>> parse_hosts('node-1:9200, node-2', 80)
+        [{'host': 'node-1', 'port': 9200}, {'host': 'node-2', 'port': 80}]
+
+    :rtype: list
+    """
+    hosts = []
+    for item in str(value).split(','):
+        host, _, port = item.strip().partition(':')
+        if not host:
+            continue
+        hosts.append({'host': host, 'port': int(port or default_port)})
+    return hosts
+
+
 def display_banner(echo=None):
     echo = echo or click.echo
     echo("   ___      _____ ___  ___ ___ ___                      ")
@@ -133,9 +168,11 @@ def display_banner(echo=None):
     echo("AWS - Detailed Billing Records parser, version {}\n".format(__version__))
 
 
-@contextlib.contextmanager
-def null_progressbar(*arg, **kwargs):
-    yield
+def is_terminal():
+    """
+    Whether the standard output is a terminal (e.g. to redraw a progress line).
+    """
+    return click.get_text_stream('stdout').isatty()
 
 
 class ClickEchoWrapper(object):
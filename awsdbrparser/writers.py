@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+#
+# awsdbrparser/writers.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import collections
+import functools
+import gzip
+import io
+import json
+import os
+import re
+import threading
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+try:
+    string_types = basestring
+except NameError:  # Python 3
+    string_types = str
+
+from . import encoders
+from .config import COMPRESSION_GZIP, COMPRESSION_NONE, COMPRESSION_ZSTD, JSON_ENCODER_JSON, MAX_OPEN_PARTITIONS
+
+EXTENSIONS = {
+    COMPRESSION_NONE: '',
+    COMPRESSION_GZIP: '.gz',
+    COMPRESSION_ZSTD: '.zst',
+}
+
+SHARD_NAME = 'part-{:05d}.json{}'
+BULK_NAME = 'bulk-{:05d}.ndjson{}'
+BULK_METADATA = 'index.json'
+
+TIMESTAMP_FIELD = 'UsageStartDate'
+DAY_PARTITION_KEY = 'dt'
+PARTITION_KEYS = {
+    'LinkedAccountId': 'account',
+}
+DEFAULT_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+UNSAFE_PARTITION_CHARS = re.compile(r'[\\/=:*?"<>|\s]')
+
+QUEUE_BATCH = 1000
+QUEUE_DEPTH = 8
+
+
+class CompressedStream(object):
+    """
+    Binary write-only stream over a buffered file, optionally wrapped by a
+    streaming gzip or zstd compressor. Closing the stream finishes the
+    compressed frame and closes the underlying file.
+    """
+
+    def __init__(self, filename, compression=COMPRESSION_NONE, buffer_size=io.DEFAULT_BUFFER_SIZE):
+        self.filename = filename
+        self._raw = io.open(filename, 'wb', buffering=buffer_size)
+        self._finish = None
+        if compression == COMPRESSION_GZIP:
+            self._stream = gzip.GzipFile(filename='', mode='wb', fileobj=self._raw)
+            self._finish = self._stream.close
+        elif compression == COMPRESSION_ZSTD:
+            try:
+                import zstandard
+            except ImportError:
+                self._raw.close()
+                raise ImportError('zstd compression requires the "zstandard" package')
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw)
+            # finish the frame but keep ownership of the raw file
+            self._finish = functools.partial(self._stream.flush, zstandard.FLUSH_FRAME)
+        else:
+            self._stream = self._raw
+
+    def write(self, data):
+        self._stream.write(data)
+
+    def close(self):
+        if self._finish is not None:
+            self._finish()
+        self._raw.close()
+
+
+class NDJSONWriter(object):
+    """
+    Writes documents as newline delimited JSON. Encoded lines are collected
+    in memory and handed to the (possibly compressed) stream in chunks of
+    ``buffer_size`` bytes, so the compressor and the file see a few large
+    writes instead of two small writes per row.
+
+    A single output file gets the ``.gz`` or ``.zst`` extension of its
+    compression appended to ``path`` when missing.
+
+    When ``max_bytes`` or ``max_rows`` is set the ``path`` is used as a
+    directory and the output is rolled into shards named ``part-00000.json``,
+    ``part-00001.json``, etc. (plus ``.gz`` or ``.zst`` when compressed). The
+    byte limit applies to the uncompressed data. Passing ``first_part`` also
+    selects the directory layout and starts numbering from that shard.
+
+    Documents are encoded with ``dumps``, a function returning UTF-8 JSON
+    bytes (see :func:`awsdbrparser.encoders.encoder_for`; defaults to the
+    standard library ``json`` module).
+    """
+
+    shard_name = SHARD_NAME
+
+    def __init__(self, path, compression=COMPRESSION_NONE, buffer_size=io.DEFAULT_BUFFER_SIZE,
+                 max_bytes=None, max_rows=None, first_part=None, dumps=None):
+        self.path = path
+        self.dumps = dumps or encoders.encoder_for(JSON_ENCODER_JSON)
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        if first_part is None and (max_bytes or max_rows):
+            first_part = 0
+        self.first_part = first_part
+        self.filenames = []
+        self.rows = 0
+        self._stream = None
+        self._pending = []
+        self._pending_bytes = 0
+        self._shard_bytes = 0
+        self._shard_rows = 0
+        if self.sharded and not os.path.isdir(path):
+            os.makedirs(path)
+
+    @property
+    def sharded(self):
+        return self.first_part is not None
+
+    @property
+    def next_part(self):
+        return self.first_part + len(self.filenames)
+
+    def write(self, document):
+        self.write_encoded(self.encode(document))
+
+    def encode(self, document):
+        return self.dumps(document) + b'\n'
+
+    def write_encoded(self, data):
+        """
+        Write one already encoded record (one or more complete lines). A shard
+        is rolled before a record that would take it past ``max_bytes``, so
+        records are never split across files.
+        """
+        too_big = self.max_bytes and self._shard_bytes + len(data) > self.max_bytes
+        if self._stream is not None and self._shard_rows and too_big:
+            self._close_shard()
+        if self._stream is None:
+            self._open()
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+        self._shard_bytes += len(data)
+        self._shard_rows += 1
+        self.rows += 1
+        if self._pending_bytes >= self.buffer_size:
+            self._drain()
+        if self.max_rows and self._shard_rows >= self.max_rows:
+            self._close_shard()
+
+    def flush(self):
+        self._drain()
+
+    def close(self):
+        if self._stream is None and not self.filenames:
+            # nothing written; still leave an (empty) output file behind
+            self._open()
+        self._close_shard()
+
+    def _open(self):
+        if self.sharded:
+            filename = os.path.join(self.path, self.shard_name.format(
+                self.next_part, EXTENSIONS[self.compression]))
+        else:
+            # name compressed files like the shards, loaders go by the extension
+            filename = self.path
+            if not filename.endswith(EXTENSIONS[self.compression]):
+                filename += EXTENSIONS[self.compression]
+        self._stream = CompressedStream(filename, compression=self.compression, buffer_size=self.buffer_size)
+        self.filenames.append(filename)
+        self._shard_bytes = self._shard_rows = 0
+
+    def _drain(self):
+        if self._pending:
+            self._stream.write(b''.join(self._pending))
+            self._pending = []
+            self._pending_bytes = 0
+
+    def _close_shard(self):
+        if self._stream is not None:
+            self._drain()
+            self._stream.close()
+            self._stream = None
+
+
+class BulkWriter(NDJSONWriter):
+    """
+    Writes ready to send Elasticsearch ``_bulk`` request bodies: an ``index``
+    action line (with the target index, document type and, when ``id_field``
+    is given, the document ``_id``) followed by the document source. Every
+    file in the ``path`` directory (``bulk-00000.ndjson``, ...) holds at most
+    ``max_rows`` documents and ``max_bytes`` bytes, so each one can be sent
+    as a single bulk request by :mod:`awsdbrparser.loader`.
+    """
+
+    shard_name = BULK_NAME
+
+    def __init__(self, path, index, doc_type, id_field=None, **options):
+        options.setdefault('first_part', 0)
+        super(BulkWriter, self).__init__(path, **options)
+        self.index = index
+        self.doc_type = doc_type
+        self.id_field = id_field
+        self._action = self._action_line(None)
+
+    def encode(self, document):
+        if self.id_field:
+            action = self._action_line(document.get(self.id_field))
+        else:
+            action = self._action
+        return action + super(BulkWriter, self).encode(document)
+
+    def write_metadata(self, mapping):
+        """
+        Save the target index, document type and mapping next to the bulk
+        files, so the loader can prepare the index before sending them.
+        """
+        with open(os.path.join(self.path, BULK_METADATA), 'w') as f:
+            json.dump({'index': self.index, 'doc_type': self.doc_type, 'mapping': mapping}, f)
+
+    def _action_line(self, _id):
+        meta = {'_index': self.index, '_type': self.doc_type}
+        if _id:
+            meta['_id'] = _id
+        return (json.dumps({'index': meta}) + '\n').encode('utf-8')
+
+
+class PartitionedWriter(object):
+    """
+    Writes documents into a Hive style directory layout::
+
+        <path>/dt=2016-03-01/account=123456789012/part-00000.json.gz
+
+    The ``dt`` partition is the day of ``UsageStartDate`` and the second level
+    is taken from the ``partition_by`` column. Only ``max_open`` partition
+    writers are kept open at a time; the least recently used one is closed when
+    a new partition shows up, and a partition that is opened again continues
+    with a new ``part-NNNNN`` file instead of overwriting the previous one.
+    """
+
+    def __init__(self, path, partition_by, max_open=MAX_OPEN_PARTITIONS, **options):
+        if max_open < 1:
+            raise ValueError('Invalid maximum of open partitions: {!r}'.format(max_open))
+        self.path = path
+        self.partition_by = partition_by
+        self.partition_key = PARTITION_KEYS.get(partition_by, partition_by)
+        self.max_open = max_open
+        self.options = options
+        self.filenames = []
+        self.rows = 0
+        self._open = collections.OrderedDict()
+        self._next_part = {}
+
+    def write(self, document):
+        directory = self.partition_for(document)
+        writer = self._open.pop(directory, None)
+        if writer is None:
+            writer = self._open_partition(directory)
+        # (re)insert as the most recently used partition
+        self._open[directory] = writer
+        writer.write(document)
+        self.rows += 1
+
+    def flush(self):
+        for writer in self._open.values():
+            writer.flush()
+
+    def close(self):
+        while self._open:
+            self._close_partition(*self._open.popitem(last=False))
+
+    def partition_for(self, document):
+        day = (document.get(TIMESTAMP_FIELD) or '').split(' ')[0]
+        value = document.get(self.partition_by)
+        return os.path.join(self.path,
+                            '{}={}'.format(DAY_PARTITION_KEY, _partition_value(day)),
+                            '{}={}'.format(self.partition_key, _partition_value(value)))
+
+    def _open_partition(self, directory):
+        if len(self._open) >= self.max_open:
+            self._close_partition(*self._open.popitem(last=False))
+        return NDJSONWriter(directory, first_part=self._next_part.get(directory, 0), **self.options)
+
+    def _close_partition(self, directory, writer):
+        writer.close()
+        self.filenames.extend(writer.filenames)
+        self._next_part[directory] = writer.next_part
+
+
+def _partition_value(value):
+    if not value or not isinstance(value, string_types):
+        return DEFAULT_PARTITION
+    return UNSAFE_PARTITION_CHARS.sub('_', value)
+
+
+class ThreadedWriter(object):
+    """
+    Wraps a writer and moves JSON encoding, compression and file I/O to a
+    background thread. Documents are handed over in batches through a bounded
+    queue, so a slow disk applies backpressure to the parser instead of
+    buffering the whole file in memory.
+    """
+
+    def __init__(self, writer, batch_size=QUEUE_BATCH, depth=QUEUE_DEPTH):
+        self.writer = writer
+        self.batch_size = batch_size
+        self._batch = []
+        self._queue = queue.Queue(maxsize=depth)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='dbrparser-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def filenames(self):
+        return self.writer.filenames
+
+    @property
+    def rows(self):
+        return self.writer.rows
+
+    def write(self, document):
+        self._batch.append(document)
+        if len(self._batch) >= self.batch_size:
+            self._put(self._batch)
+            self._batch = []
+
+    def flush(self):
+        if self._batch:
+            self._put(self._batch)
+            self._batch = []
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_pending()
+
+    def _put(self, batch):
+        self._raise_pending()
+        self._queue.put(batch)
+
+    def _raise_pending(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            if self._error is not None:
+                # keep draining so the producer never blocks on a full queue
+                continue
+            try:
+                for document in batch:
+                    self.writer.write(document)
+            except Exception as e:
+                self._error = e
+        try:
+            self.writer.close()
+        except Exception as e:
+            self._error = self._error or e
+
+
+def open_writer(config):
+    """
+    Build the document writer for file output according to the given
+    :class:`~awsdbrparser.config.Config` instance.
+    """
+    options = dict(compression=config.output_compression,
+                   buffer_size=config.output_buffer_size,
+                   max_bytes=config.shard_max_bytes,
+                   max_rows=config.shard_max_rows,
+                   dumps=encoders.encoder_for(config.json_encoder, debug=config.debug))
+    if config.partition_by:
+        writer = PartitionedWriter(config.output_filename, config.partition_by,
+                                   max_open=config.max_open_partitions, **options)
+    else:
+        writer = NDJSONWriter(config.output_filename, **options)
+    if config.writer_thread:
+        writer = ThreadedWriter(writer)
+    return writer
+
+
+def open_bulk_writer(config):
+    """
+    Build the Elasticsearch bulk file writer according to the given
+    :class:`~awsdbrparser.config.Config` instance.
+    """
+    writer = BulkWriter(config.output_filename, config.index_name, config.es_doctype,
+                        id_field=config.es_id_field,
+                        compression=config.output_compression,
+                        buffer_size=config.output_buffer_size,
+                        max_bytes=config.bulk_max_bytes,
+                        max_rows=config.bulk_size,
+                        dumps=encoders.encoder_for(config.json_encoder, debug=config.debug))
+    writer.write_metadata(config.mapping)
+    if config.writer_thread:
+        writer = ThreadedWriter(writer)
+    return writer
@@ -66,6 +66,13 @@ setup(
     zip_safe=False,
     platforms='any',
     install_requires=read_requirements(),
+    extras_require={
+        'zstd': ['zstandard'],
+        'parquet': ['pyarrow'],
+        'orjson': ['orjson'],
+        'ujson': ['ujson'],
+        'async': ['aiohttp'],
+    },
     entry_points={
         'console_scripts': [
             'dbrparser = awsdbrparser.cli:main',
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+#
+# tests/conftest.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import io
+import json
+import socket
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import pytest
+
+from awsdbrparser import aggregations
+from awsdbrparser.config import Config
+
+DBR_HEADER = (
+    u'"InvoiceID","PayerAccountId","LinkedAccountId","RecordType","RecordId","ProductName","RateId",'
+    u'"SubscriptionId","PricingPlanId","UsageType","Operation","AvailabilityZone","ReservedInstance",'
+    u'"ItemDescription","UsageStartDate","UsageEndDate","UsageQuantity","BlendedRate","BlendedCost",'
+    u'"UnBlendedRate","UnBlendedCost","ResourceId","user:Name"\n')
+
+DBR_ROWS = (
+    u'"Estimated","111111111111","222222222222","LineItem","1","Amazon Elastic Compute Cloud","1","1","1",'
+    u'"USW2-BoxUsage:m4.large","RunInstances","us-west-2a","N","m4.large Linux","2016-03-01 00:00:00",'
+    u'"2016-03-01 01:00:00","1","0.1","0.1","0.1","0.1","i-1","web"\n'
+    u'"Estimated","111111111111","222222222222","LineItem","2","Amazon Elastic Compute Cloud","1","1","1",'
+    u'"USW2-HeavyUsage:m4.large","RunInstances","us-west-2a","Y","m4.large reserved","2016-03-01 00:00:00",'
+    u'"2016-03-01 01:00:00","1","0.05","0.05","0.05","0.05","i-2",""\n'
+    u'"Estimated","111111111111","333333333333","LineItem","3","Amazon Elastic Compute Cloud","1","1","1",'
+    u'"USW2-SpotUsage:c4.xlarge","RunInstances:SV002","us-west-2b","N","c4.xlarge spot","2016-03-02 05:00:00",'
+    u'"2016-03-02 06:00:00","1","0.04","0.04","0.04","0.04","i-3",""\n'
+    u'"Estimated","111111111111","222222222222","LineItem","4","Amazon Simple Storage Service","1","1","1",'
+    u'"USW2-TimedStorage-ByteHrs","StandardStorage","","N","S3 storage","2016-03-02 00:00:00",'
+    u'"2016-03-02 01:00:00","10","0.02","0.2","0.02","0.2","bucket",""\n'
+    u'"Estimated","111111111111","","InvoiceTotal","","","","","","","","","","Total","","","","","0.39","",'
+    u'"0.39","",""\n')
+
+
+INDEX_SETTINGS = {'index.number_of_replicas': '2', 'index.refresh_interval': '30s'}
+"""
+Flat settings of the indices of a :class:`FakeCluster` until they are changed.
+"""
+
+
+@pytest.fixture
+def dbr_file(tmpdir):
+    filename = str(tmpdir.join('dbr.csv'))
+    with io.open(filename, 'w', encoding='utf-8') as f:
+        f.write(DBR_HEADER + DBR_ROWS)
+    return filename
+
+
+@pytest.fixture
+def config(dbr_file):
+    config = Config()
+    config.es2 = False
+    config.input_filename = dbr_file
+    return config
+
+
+class NodeHandler(BaseHTTPRequestHandler):
+    # answers bulk and index requests like an Elasticsearch node, recording them
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.requests.append((self.path, body))
+        time.sleep(0.02)
+        if server.status >= 300:
+            reply = {'error': {'type': 'es_rejected_execution_exception'}, 'status': server.status}
+        elif self.path.endswith('/_bulk'):
+            items = [{'index': {'status': 201}} for _ in body.splitlines()[::2]]
+            reply = {'errors': False, 'items': items}
+        else:
+            reply = {'_shards': {'successful': 1}, 'created': True}
+        data = json.dumps(reply).encode('utf-8')
+        with server.lock:
+            server.in_flight -= 1
+        self.send_response(server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def node():
+    """
+    A fake Elasticsearch node on a local port; ``requests`` holds the
+    ``(path, body)`` of the requests received and ``max_in_flight`` the
+    most requests it handled at once. Requests are answered with ``status``
+    (an error without items when it is not 2xx).
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), NodeHandler)
+    server.lock = threading.Lock()
+    server.in_flight = server.max_in_flight = 0
+    server.requests = []
+    server.status = 201
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def closed_port():
+    """
+    A local port nothing listens on.
+    """
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class FakeIndices(object):
+    def __init__(self, events):
+        self.events = events
+        self.settings = {}
+
+    def exists(self, index):
+        return False
+
+    def create(self, index, ignore=None, body=None):
+        pass
+
+    def put_mapping(self, index, doc_type, body):
+        pass
+
+    def get_settings(self, index, flat_settings):
+        return {index: {'settings': dict(self.settings.get(index, INDEX_SETTINGS))}}
+
+    def put_settings(self, index, body):
+        self.events.append(('settings', index, body['index']))
+        self.settings[index] = dict(('index.' + name, value) for name, value in body['index'].items())
+
+    def forcemerge(self, index, max_num_segments, request_timeout):
+        self.events.append(('forcemerge', index))
+
+    def refresh(self, index):
+        self.events.append(('refresh', index))
+
+
+class FakeCluster(object):
+    """
+    In memory Elasticsearch client. Records the bulk ``bodies`` and the
+    documents they index, the indexed documents and their ``ids``, and the
+    bulk requests and index settings changes as ``events``; answers the hourly
+    usage search over ``documents`` the way Elasticsearch would.
+
+    :param statuses: the item statuses of every bulk response, by default 201
+        for each document.
+    """
+
+    def __init__(self, documents=(), statuses=None):
+        self.documents = list(documents)
+        self.statuses = statuses
+        self.events = []
+        self.indices = FakeIndices(self.events)
+        self.bodies = []
+        self.indexed = []
+        self.bulk_indexed = []
+        self.ids = []
+        self._lock = threading.Lock()
+
+    def index(self, index, doc_type, body, id=None):
+        with self._lock:
+            self.indexed.append((index, doc_type, body))
+            self.ids.append(id)
+        return {'_shards': {'successful': 1}}
+
+    def bulk(self, body):
+        data = body.decode('utf-8') if isinstance(body, bytes) else body
+        lines = [json.loads(line) for line in data.splitlines()]
+        with self._lock:
+            self.events.append(('bulk',))
+            self.bodies.append(body)
+            for action, document in zip(lines[::2], lines[1::2]):
+                self.bulk_indexed.append((action['index']['_index'], action['index'].get('_type'), document))
+                self.ids.append(action['index'].get('_id'))
+        statuses = self.statuses if self.statuses is not None else [201] * len(lines[::2])
+        return {'errors': False, 'items': [{'index': {'status': status}} for status in statuses]}
+
+    def search(self, index, doc_type, body):
+        date_range, usage_items = body['query']['bool']['filter']
+        start = date_range['range']['UsageStartDate']
+        usage_items = [query['match_phrase']['UsageItem'] for query in usage_items['bool']['should']]
+        buckets = {}
+        for document in self.documents:
+            daytime = document['UsageStartDate']
+            if document['UsageItem'] not in usage_items or not start['gte'] <= daytime < start['lt']:
+                continue
+            bucket = buckets.setdefault(daytime, {'key_as_string': daytime, 'doc_count': 0,
+                                                  'Cost': {'value': 0.0}, 'Unblended': {'value': 0.0},
+                                                  'RI': {'doc_count': 0}, 'Spot': {'doc_count': 0}})
+            bucket['doc_count'] += 1
+            bucket['Cost']['value'] += float(document.get('Cost', 0.0))
+            bucket['Unblended']['value'] += float(document.get('UnBlendedCost', 0.0))
+            bucket['RI']['doc_count'] += document['UsageItem'] == aggregations.RESERVED_INSTANCE
+            bucket['Spot']['doc_count'] += document['UsageItem'] == aggregations.SPOT_INSTANCE
+        return {'aggregations': {'hours': {'buckets': [buckets[key] for key in sorted(buckets)]}}}
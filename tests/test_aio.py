@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_aio.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+
+import pytest
+
+from awsdbrparser import parser
+from awsdbrparser.config import OUTPUT_TO_ELASTICSEARCH, PROCESS_BY_BULK, PROCESS_BY_LINE
+from awsdbrparser.utils import ParserError
+
+from .conftest import closed_port
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from awsdbrparser import aio  # noqa: E402
+
+
+@pytest.mark.parametrize('mode', [PROCESS_BY_BULK, PROCESS_BY_LINE])
+def test_requests_are_sent_concurrently_within_the_window(config, node, mode):
+    config.output_type = OUTPUT_TO_ELASTICSEARCH
+    config.process_mode = mode
+    config.bulk_size = 1
+    config.es_host = '127.0.0.1:{},127.0.0.1:{}'.format(closed_port(), node.server_port)
+    config.es_async = True
+    config.es_max_in_flight = 3
+
+    sink = aio.AsyncElasticsearchSink(config)
+    summary = parser.parse(config, sink=sink)
+
+    assert summary.added == 4
+    assert len(node.requests) == 4
+    assert 1 < node.max_in_flight <= 3
+    assert sorted(json.loads(body.splitlines()[-1])['RecordId'] for _, body in node.requests) == ['1', '2', '3', '4']
+
+
+def test_connection_errors_are_raised(config):
+    config.output_type = OUTPUT_TO_ELASTICSEARCH
+    config.es_host = '127.0.0.1:{}'.format(closed_port())
+    config.es_max_retries = 1
+
+    sink = aio.AsyncElasticsearchSink(config)
+    with pytest.raises(aiohttp.ClientConnectionError):
+        parser.parse(config, sink=sink)
+    assert sink.added == 0
+
+
+def test_rejected_bulk_requests_fail_their_documents(config, node):
+    node.status = 429
+    config.output_type = OUTPUT_TO_ELASTICSEARCH
+    config.process_mode = PROCESS_BY_BULK
+    config.bulk_size = 3
+    config.es_host = '127.0.0.1:{}'.format(node.server_port)
+
+    sink = aio.AsyncElasticsearchSink(config)
+    assert parser.parse(config, sink=sink).added == 0
+    assert sink.failed == 4
+
+    config.fail_fast = True
+    sink = aio.AsyncElasticsearchSink(config)
+    with pytest.raises(ParserError, match='status 429'):
+        parser.parse(config, sink=sink)
+
+
+def test_sinks_share_an_event_loop(config, node):
+    config.output_type = OUTPUT_TO_ELASTICSEARCH
+    config.es_host = '127.0.0.1:{}'.format(node.server_port)
+    config.es_async = True
+
+    loop = aio.EventLoop()
+    try:
+        for _ in range(2):
+            assert parser.parse(config, sink=aio.AsyncElasticsearchSink(config, loop=loop)).added == 4
+        assert loop.loop.is_running()
+    finally:
+        loop.close()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_analytics.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from awsdbrparser import aggregations
+from awsdbrparser import parser
+from awsdbrparser import utils
+from awsdbrparser.config import PROCESS_BI_ONLY
+
+from .conftest import DBR_HEADER, DBR_ROWS, FakeCluster
+
+
+def test_analytics_from_index_matches_analytics_from_file(config, monkeypatch):
+    config.es_year, config.es_month = 2016, 3
+    echo = utils.ClickEchoWrapper(quiet=True)
+
+    from_file = FakeCluster()
+    monkeypatch.setattr(parser, 'elasticsearch_client', lambda config: from_file)
+    parser.analytics(config, echo)
+
+    from_index = FakeCluster(list(parser.iter_documents(config)))
+    monkeypatch.setattr(parser, 'elasticsearch_client', lambda config: from_index)
+    config.input_filename = 'missing.csv'
+    config.process_mode = PROCESS_BI_ONLY
+    config.analytics = config.analytics_from_index = True
+    assert parser.parse(config) == parser.Summary(0, 0, 0, 0)
+
+    assert len(from_index.indexed) == 4  # two hours and two days
+    assert sorted(from_index.indexed, key=repr) == sorted(from_file.indexed, key=repr)
+
+
+def test_hourly_usage_query_is_limited_to_the_month(config):
+    config.es_year, config.es_month = 2016, 12
+    query = aggregations.hourly_usage_query(config)
+    date_range = query['query']['bool']['filter'][0]['range']['UsageStartDate']
+    assert date_range == {'gte': '2016-12-01 00:00:00', 'lt': '2017-01-01 00:00:00'}
+
+
+def test_analytics_indexes_top_and_distinct_resources(config, monkeypatch):
+    config.es_year, config.es_month = 2016, 3
+    config.analytics_top_resources = 1
+    cluster = FakeCluster()
+    monkeypatch.setattr(parser, 'elasticsearch_client', lambda config: cluster)
+    parser.analytics(config, utils.ClickEchoWrapper(quiet=True))
+
+    top = [(day['UsageStartDate'], day['ResourceId']) for index, doc_type, day in cluster.bulk_indexed
+           if doc_type == 'top_resources']
+    assert top == [('2016-03-01 12:00:00', 'i-1'), ('2016-03-02 12:00:00', 'bucket')]
+    distinct = [(d['UsageStartDate'][:10], d['ProductName'], d['DistinctResources'])
+                for index, doc_type, d in cluster.bulk_indexed if index == 'distinct_resources']
+    assert distinct == [('2016-03-01', 'Amazon Elastic Compute Cloud', 2),
+                        ('2016-03-02', 'Amazon Elastic Compute Cloud', 1),
+                        ('2016-03-02', 'Amazon Simple Storage Service', 1)]
+
+
+def test_incremental_analytics_resume_from_the_state(config, monkeypatch, tmpdir):
+    config.es_year, config.es_month = 2016, 3
+    config.analytics_state = str(tmpdir.join('state.json'))
+    echo = utils.ClickEchoWrapper(quiet=True)
+    line_items = DBR_ROWS.splitlines(True)[:-1]
+
+    def run(rows):
+        with open(config.input_filename, 'w') as f:
+            f.write(DBR_HEADER + ''.join(rows))
+        cluster = FakeCluster()
+        monkeypatch.setattr(parser, 'elasticsearch_client', lambda config: cluster)
+        parser.analytics(config, echo)
+        return cluster
+
+    full = run(line_items)
+    config.analytics_state = str(tmpdir.join('incremental.json'))
+    run(line_items[:2] + DBR_ROWS.splitlines(True)[-1:])  # the first day and the invoice total
+    second_day = run(line_items)
+
+    # only the second day is emitted again, with the same ids and values as a full run
+    days = set(body['UsageStartDate'][:10] for _, _, body in second_day.indexed + second_day.bulk_indexed)
+    assert days == {'2016-03-02'}
+    full_ids = dict(zip(full.ids, full.indexed + full.bulk_indexed))
+    for doc_id, document in zip(second_day.ids, second_day.indexed + second_day.bulk_indexed):
+        assert doc_id.startswith(config.account_id) and full_ids[doc_id] == document
+
+    # a file that does not extend the saved one is processed from the start
+    rebuilt = run(line_items[1:])
+    assert len(rebuilt.indexed) == 4
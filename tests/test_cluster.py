@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_cluster.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pytest
+
+from awsdbrparser import parser
+from awsdbrparser.config import ES_SELECTOR_LEAST_LOADED, Config
+
+from .conftest import closed_port
+
+pytest.importorskip('elasticsearch')
+
+from awsdbrparser import cluster  # noqa: E402
+
+
+class Connection(object):
+    def __init__(self, in_flight):
+        self.in_flight = in_flight
+
+
+def test_least_loaded_selector_prefers_idle_nodes_and_rotates_ties():
+    selector = cluster.LeastLoadedSelector({})
+    busy, idle = Connection(3), Connection(0)
+    assert [selector.select([busy, idle]) for _ in range(3)] == [idle, idle, idle]
+
+    first, second = Connection(0), Connection(0)
+    assert set(selector.select([first, second]) for _ in range(2)) == {first, second}
+
+
+@pytest.mark.parametrize('selector', [None, ES_SELECTOR_LEAST_LOADED])
+def test_requests_are_retried_on_another_node(node, selector):
+    config = Config()
+    config.es_host = '127.0.0.1:{},127.0.0.1:{}'.format(closed_port(), node.server_port)
+    config.es_timeout = 5
+    if selector:
+        config.es_selector = selector
+
+    es = parser.elasticsearch_client(config)
+    for _ in range(4):
+        assert es.bulk(body=b'{"index": {}}\n{}\n', index='billing', doc_type='billing')['errors'] is False
+
+    assert len(node.requests) == 4
+    assert len(es.transport.connection_pool.connections) == 1
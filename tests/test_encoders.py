@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_encoders.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+
+import pytest
+
+from awsdbrparser import encoders
+from awsdbrparser import parser
+from awsdbrparser import sinks
+from awsdbrparser.config import JSON_ENCODER_AUTO, JSON_ENCODER_JSON, OUTPUT_TO_ELASTICSEARCH, PROCESS_BY_BULK
+from awsdbrparser.utils import ParserError
+
+from .conftest import FakeCluster
+
+DOCUMENT = {'ItemDescription': u'São Paulo', 'user': {'Name': 'web'}, 'NormalizedUnits': 4.0}
+
+
+@pytest.mark.parametrize('name', [JSON_ENCODER_AUTO, JSON_ENCODER_JSON])
+def test_encoders_return_utf8_bytes(name):
+    data = encoders.encoder_for(name)(DOCUMENT)
+    assert isinstance(data, bytes)
+    assert u'São Paulo'.encode('utf-8') in data
+    assert json.loads(data.decode('utf-8')) == DOCUMENT
+
+
+def test_unknown_and_missing_encoders():
+    with pytest.raises(ValueError):
+        encoders.encoder_for('yaml')
+    for name, factory in encoders.BACKENDS:
+        try:
+            factory()
+        except ImportError:
+            with pytest.raises(ImportError, match=name):
+                encoders.encoder_for(name)
+
+
+def test_bulk_sink_encodes_each_document_once(config, capsys):
+    config.output_type = OUTPUT_TO_ELASTICSEARCH
+    config.process_mode = PROCESS_BY_BULK
+    config.debug = True
+    es = FakeCluster()
+    summary = parser.parse(config, sink=sinks.ElasticsearchBulkSink(es, config))
+    assert summary.added == 4
+
+    lines = es.bodies[0].splitlines()
+    assert json.loads(lines[0].decode('utf-8')) == {'index': {'_index': 'billing', '_type': 'billing'}}
+    # debug output is the encoded source, printed once per document
+    printed = capsys.readouterr().out.splitlines()
+    assert [line.decode('utf-8') for line in lines[1::2]] == printed
+
+
+def test_bulk_sink_fail_fast(config):
+    config.fail_fast = True
+    sink = sinks.ElasticsearchBulkSink(FakeCluster(statuses=[201, 400]), config)
+    with pytest.raises(ParserError):
+        sink.write_many([DOCUMENT, DOCUMENT])
+    assert sink.added == 1
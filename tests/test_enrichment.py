@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_enrichment.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pytest
+
+from awsdbrparser import enrichment
+from awsdbrparser.utils import pre_process
+
+EC2 = 'Amazon Elastic Compute Cloud'
+
+
+@pytest.mark.parametrize('operation, usage_type, reserved, expected', [
+    ('RunInstances', 'USW2-BoxUsage:m4.large', 'N', {
+        'UsageItem': 'On-Demand', 'Region': 'us-west-2', 'InstanceType': 'm4.large',
+        'InstanceFamily': 'm4', 'InstanceSize': 'large', 'NormalizationFactor': 4.0}),
+    ('RunInstances:0002', 'EU-HeavyUsage:c4.2xlarge', 'Y', {
+        'UsageItem': 'Reserved Instance', 'Region': 'eu-west-1', 'InstanceType': 'c4.2xlarge',
+        'InstanceFamily': 'c4', 'InstanceSize': '2xlarge', 'NormalizationFactor': 16.0}),
+    ('RunInstances:SV002', 'SpotUsage:i3.metal', 'N', {
+        'UsageItem': 'Spot Instance', 'Region': 'us-east-1', 'InstanceType': 'i3.metal',
+        'InstanceFamily': 'i3', 'InstanceSize': 'metal'}),
+    ('RunInstances', 'USE2-EBSOptimized', 'N', {
+        'UsageItem': '', 'Region': 'us-east-2', 'InstanceType': 'N/A'}),
+    ('CreateVolume', 'USW2-EBS:VolumeUsage.gp2', 'N', {
+        'UsageItem': '', 'Region': 'us-west-2'}),
+])
+def test_classify(operation, usage_type, reserved, expected):
+    assert enrichment.classify(EC2, operation, usage_type, reserved) == expected
+
+
+@pytest.mark.parametrize('usage_type, region', [
+    ('APN1-BoxUsage:m4.large', 'ap-northeast-1'),
+    ('BoxUsage:m4.large', 'us-east-1'),
+    ('DataTransfer-Out-Bytes', 'us-east-1'),
+    ('APS4-BoxUsage:m5.large', ''),
+    ('MEC1-BoxUsage:m5.large', ''),
+    ('US-DataTransfer-Out-Bytes', ''),
+    ('', ''),
+])
+def test_region_for(usage_type, region):
+    assert enrichment.region_for(usage_type) == region
+
+
+def test_pre_process_normalized_units():
+    document = pre_process({'ProductName': EC2, 'Operation': 'RunInstances', 'ReservedInstance': 'N',
+                            'UsageType': 'BoxUsage:t2.micro', 'UsageQuantity': '24', 'user:Name': 'web'})
+    assert document['NormalizedUnits'] == 12.0
+    assert document['user'] == {'Name': 'web'}
+    assert 'NormalizedUnits' not in pre_process({'ProductName': 'Amazon Simple Storage Service',
+                                                 'Operation': 'StandardStorage', 'UsageType': 'TimedStorage'})
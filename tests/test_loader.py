@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_loader.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+
+from awsdbrparser import loader
+from awsdbrparser import writers
+from awsdbrparser.config import COMPRESSION_GZIP, Config
+
+from .conftest import FakeCluster
+
+
+def test_bulk_files_are_sent_unchanged_to_every_cluster(tmpdir):
+    path = str(tmpdir.join('bulk'))
+    writer = writers.BulkWriter(path, 'billing', 'billing', id_field='RecordId',
+                                compression=COMPRESSION_GZIP, max_rows=2)
+    for n in range(5):
+        writer.write({'RecordId': str(n)})
+    writer.close()
+
+    clusters = [FakeCluster(), FakeCluster()]
+    summary = loader.load(Config(), clusters, [path], concurrency=2)
+
+    assert summary == loader.LoadSummary(requests=6, added=10, failed=0)
+    for cluster in clusters:
+        bodies = sorted(cluster.bodies)
+        assert bodies == sorted(loader.read_body(f) for f in writer.filenames)
+        actions = [json.loads(line) for body in bodies for line in body.decode('utf-8').splitlines()[::2]]
+        assert sorted(a['index']['_id'] for a in actions) == ['0', '1', '2', '3', '4']
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_parquet.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import datetime
+
+import pytest
+
+from awsdbrparser import parquet
+from awsdbrparser.config import Config
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def test_parquet_schema_and_row_groups(tmpdir):
+    config = Config()
+    config.es2 = False
+    filename = str(tmpdir.join('out.parquet'))
+    writer = parquet.ParquetWriter(filename, config.doctype, row_group_size=2, compression='snappy')
+    for n in range(5):
+        writer.write({'UsageStartDate': '2016-03-01 0{}:00:00'.format(n),
+                      'Cost': '' if n == 4 else '0.5',
+                      'ResourceId': 'i-{}'.format(n),
+                      'user': {'Name': 'web'},
+                      'UsageItem': ''})
+    writer.close()
+
+    parquet_file = pq.ParquetFile(filename)
+    assert parquet_file.metadata.num_row_groups == 3
+    schema = parquet_file.schema_arrow
+    assert schema.field('Cost').type == pa.float64()
+    assert schema.field('UsageStartDate').type == pa.timestamp('ms')
+    assert pa.types.is_map(schema.field('user').type)
+    assert schema.field('InstanceType').type == pa.string()
+
+    rows = parquet_file.read().to_pylist()
+    assert rows[0]['UsageStartDate'] == datetime.datetime(2016, 3, 1, 0)
+    assert rows[0]['user'] == [('Name', 'web')]
+    assert rows[4]['Cost'] is None
+    assert rows[4]['InstanceType'] is None
+
+
+def test_empty_input_writes_an_empty_file(tmpdir):
+    config = Config()
+    config.es2 = False
+    filename = str(tmpdir.join('out.parquet'))
+    writer = parquet.ParquetWriter(filename, config.doctype, row_group_size=2, compression='snappy')
+    writer.close()
+    writer.close()
+
+    table = pq.read_table(filename)
+    assert table.num_rows == 0
+    assert table.schema.field('Cost').type == pa.float64()
+    assert table.schema.field('UsageItem').type == pa.string()
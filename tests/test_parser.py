@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_parser.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import io
+import json
+
+from awsdbrparser import parser
+from awsdbrparser.sinks import Sink
+
+from .conftest import DBR_HEADER, DBR_ROWS
+
+
+class ListSink(Sink):
+    def __init__(self):
+        super(ListSink, self).__init__()
+        self.batches = []
+        self.closed = False
+
+    def write_many(self, documents):
+        self.batches.append(list(documents))
+        self.added += len(documents)
+
+    def close(self):
+        self.closed = True
+
+
+def test_iter_documents(config):
+    counts = {}
+    documents = list(parser.iter_documents(config, counts=counts))
+    assert [d['RecordId'] for d in documents] == ['1', '2', '3', '4']
+    assert [d['UsageItem'] for d in documents] == ['On-Demand', 'Reserved Instance', 'Spot Instance', '']
+    assert documents[0]['user'] == {'Name': 'web'}
+    assert counts == {'records': 5, 'control_messages': 1}
+
+
+def test_parse_into_custom_sink(config):
+    config.bulk_size = 3
+    sink = ListSink()
+    summary = parser.parse(config, sink=sink)
+    assert summary == parser.Summary(added=4, skipped=0, updated=0, control_messages=1)
+    assert [len(batch) for batch in sink.batches] == [3, 1]
+    assert sink.closed
+
+
+def test_parse_non_ascii_input(config, tmpdir):
+    with io.open(config.input_filename, 'w', encoding='utf-8') as f:
+        f.write(DBR_HEADER + DBR_ROWS.replace(u'"web"', u'"caf\u00e9"'))
+    config.output_filename = str(tmpdir.join('out.json'))
+    assert parser.parse(config).added == 4
+    with io.open(config.output_filename, encoding='utf-8') as f:
+        assert json.loads(f.readline())['user'] == {'Name': u'caf\u00e9'}
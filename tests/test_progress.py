@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_progress.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import gzip
+import io
+import json
+import os
+
+import pytest
+
+from awsdbrparser import parser
+from awsdbrparser import progress
+from awsdbrparser import sinks
+
+from .conftest import DBR_HEADER, DBR_ROWS
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_progress_follows_the_compressed_position(config, tmpdir):
+    config.input_filename = str(tmpdir.join('dbr.csv.gz'))
+    with gzip.open(config.input_filename, 'wb') as f:
+        f.write(((DBR_HEADER + DBR_ROWS) * 2000).encode('utf-8'))
+    size = os.path.getsize(config.input_filename)
+    status_file = str(tmpdir.join('status.json'))
+
+    clock = FakeClock()
+    sink = sinks.Sink()
+    file_in = parser.open_input(config)
+    tracker = progress.Progress(file_in, sink, status_file=status_file, status_interval=5, clock=clock)
+    assert tracker.size == size
+
+    lines = []
+    tracker.echo = lambda line, nl=True: lines.append(line)
+    for n, row in enumerate(file_in, 1):
+        if n % 1000 == 0:
+            clock.now += 1
+            sink.added = n
+            tracker.update(n)
+            assert 0 < tracker.position <= size
+    file_in.close()
+
+    status = json.load(open(status_file))
+    assert status['state'] == 'running' and status['acknowledged'] == 10000
+    assert status['rows_per_second'] == 1000.0 and status['eta_seconds'] >= 0
+    assert '% of' in lines[0] and 'ETA' in lines[0]
+
+    tracker.finish(n)
+    status = json.load(open(status_file))
+    assert status['state'] == 'finished' and status['percent'] == 100.0 and status['records'] == n
+
+
+def test_parse_writes_the_status_file_without_counting_lines(config, tmpdir):
+    config.status_file = str(tmpdir.join('status.json'))
+    config.output_filename = str(tmpdir.join('out.json'))
+    summary = parser.parse(config)
+    status = json.load(open(config.status_file))
+    assert status['records'] == 5 and status['acknowledged'] == summary.added == 4
+    assert status['bytes_read'] == status['bytes_total'] == os.path.getsize(config.input_filename)
+
+
+def test_failed_parse_is_reported_in_the_status_file(config, tmpdir):
+    class FailingSink(sinks.Sink):
+        def write_many(self, documents):
+            raise IOError('disk full')
+
+    config.status_file = str(tmpdir.join('status.json'))
+    with pytest.raises(IOError):
+        parser.parse(config, sink=FailingSink())
+    status = json.load(open(config.status_file))
+    assert status['state'] == 'failed' and 'disk full' in status['error']
+
+
+def test_unknown_size_reports_rows_only():
+    tracker = progress.Progress(io.StringIO(u'a\n'), sinks.Sink(), clock=FakeClock())
+    assert tracker.size is None and tracker.percent() is None and tracker.eta() is None
+    assert tracker.line().startswith('0.0 MB')
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_rows.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import csv
+import io
+
+from awsdbrparser import parser
+from awsdbrparser import rows
+from awsdbrparser import utils
+from awsdbrparser.config import Config
+
+from .conftest import DBR_HEADER, DBR_ROWS
+
+
+def test_documents_match_pre_process():
+    lines = (DBR_HEADER + DBR_ROWS).splitlines()
+    layout = rows.Layout(next(csv.reader(lines)))
+    dict_rows = list(csv.DictReader(lines))
+    for row, dict_row in zip(csv.reader(lines[1:]), dict_rows):
+        assert layout.document(row) == utils.pre_process(dict_row)
+
+
+def test_short_rows_are_padded():
+    layout = rows.Layout(['ProductName', 'UsageType', 'user:Name'])
+    assert layout.document(['Amazon Simple Storage Service']) == {
+        'ProductName': 'Amazon Simple Storage Service', 'UsageType': None, 'user': {'Name': None},
+        'UsageItem': '', 'Region': ''}
+
+
+def test_control_filter():
+    layout = rows.Layout(['RecordType', 'ResourceId'])
+    is_control = layout.control_filter(Config().bulk_msg)
+    assert is_control(['InvoiceTotal', ''])
+    assert not is_control(['LineItem', 'i-1'])
+    assert not is_control([])
+
+    is_control = layout.control_filter({'RecordType': ['Rounding'], 'ResourceId': ['i-0'], 'Missing': ['x']})
+    assert is_control(['LineItem', 'i-0'])
+    assert not is_control(['LineItem', 'i-1'])
+
+
+def test_iter_records(dbr_file):
+    config = Config()
+    config.input_filename = dbr_file
+    counts = {}
+    records = list(parser.iter_records(config, counts=counts))
+    assert [(r['RecordId'], r.get('user:Name'), r.get('Missing')) for r in records] == [
+        ('1', 'web', None), ('2', '', None), ('3', '', None), ('4', '', None)]
+    assert counts == {'records': 5, 'control_messages': 1}
+    assert 'ResourceId' in records[0] and not hasattr(records[0], '__dict__')
+
+
+def test_blank_lines_are_skipped():
+    config = Config()
+    stream = io.StringIO(DBR_HEADER + u'\n' + DBR_ROWS)
+    assert len(list(parser.iter_documents(config, stream))) == 4
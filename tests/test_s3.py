@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_s3.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import csv
+import gzip
+import io
+
+import pytest
+
+from awsdbrparser import progress
+from awsdbrparser import s3
+from awsdbrparser.config import Config
+
+moto = pytest.importorskip('moto')
+boto3 = pytest.importorskip('boto3')
+
+CSV = u'"RecordId","ItemDescription"\n' + u''.join(
+    u'"{0}","line {0}\nwith a quoted newline and ção"\n'.format(n) for n in range(500))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with moto.mock_aws():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket='bucket-123456')
+        yield client
+
+
+@pytest.fixture
+def config():
+    config = Config()
+    config.s3_part_size = 100  # many small parts, out of order completion
+    config.s3_concurrency = 4
+    config.s3_read_ahead = 3
+    return config
+
+
+def test_split_s3_url():
+    assert s3.split_s3_url('s3://bucket/path/to/dbr.csv') == ('bucket', 'path/to/dbr.csv')
+    with pytest.raises(ValueError):
+        s3.split_s3_url('s3://bucket')
+
+
+@pytest.mark.parametrize('key', ['dbr.csv', 'dbr.csv.gz'])
+def test_stream_csv_from_s3(client, config, key):
+    body = CSV.encode('utf-8')
+    if key.endswith('.gz'):
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+            f.write(body)
+        body = buf.getvalue()
+    client.put_object(Bucket='bucket-123456', Key=key, Body=body)
+
+    stream = s3.open_s3(config, 's3://bucket-123456/' + key, client=client)
+    rows = list(csv.DictReader(stream))
+    # the progress follows the (compressed) bytes read from S3
+    position = progress.byte_stream(stream)
+    assert position.tell() == progress.stream_size(position) == len(body)
+    stream.close()
+
+    assert len(rows) == 500
+    assert rows[499]['ItemDescription'] == u'line 499\nwith a quoted newline and ção'
+
+
+def test_objects_overwritten_while_read_fail(client, config):
+    client.put_object(Bucket='bucket-123456', Key='dbr.csv', Body=CSV.encode('utf-8'))
+    config.s3_concurrency = config.s3_read_ahead = 1
+    stream = s3.open_s3(config, 's3://bucket-123456/dbr.csv', client=client)
+    stream.readline()
+
+    client.put_object(Bucket='bucket-123456', Key='dbr.csv', Body=CSV.upper().encode('utf-8'))
+    with pytest.raises(client.exceptions.ClientError, match='PreconditionFailed'):
+        stream.read()
+    stream.close()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_serve.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import copy
+import os
+import shutil
+import time
+
+from awsdbrparser import parser
+from awsdbrparser import serve
+
+DBR_NAME = '123456789012-aws-billing-detailed-line-items-with-resources-and-tags-2016-03.csv'
+
+
+def test_config_for_standard_dbr_name(config, tmpdir):
+    job = serve.config_for(config, os.path.join('/mnt/jobs', DBR_NAME), output_dir=str(tmpdir))
+    assert (job.account_id, job.es_year, job.es_month) == ('123456789012', 2016, 3)
+    assert job.output_filename == str(tmpdir.join(DBR_NAME[:-len('.csv')] + '.json'))
+    assert config.input_filename != job.input_filename
+
+
+def test_serve_skips_unchanged_files(config, dbr_file, tmpdir):
+    watched = tmpdir.mkdir('watched')
+    source = str(watched.join(DBR_NAME))
+    shutil.copy(dbr_file, source)
+    past = time.time() - 2 * serve.SETTLE_TIME
+    os.utime(source, (past, past))
+    state_file = str(tmpdir.join('state.json'))
+    output_dir = str(tmpdir.join('out'))
+
+    results = serve.serve(config, [str(watched)], state_file=state_file, once=True, output_dir=output_dir)
+    assert results[source].added == 4
+    assert os.listdir(output_dir) == [DBR_NAME[:-len('.csv')] + '.json']
+
+    # a new process with the same state file has nothing to do
+    assert serve.serve(config, [str(watched)], state_file=state_file, once=True, output_dir=output_dir) == {}
+
+    with open(source, 'a') as f:
+        f.write('\n')
+    os.utime(source, (past, past + 1))
+    results = serve.serve(config, [str(watched)], state_file=state_file, once=True, output_dir=output_dir)
+    assert list(results) == [source]
+
+
+def test_warm_sinks_reuse_the_client_of_an_endpoint(config, monkeypatch):
+    created = []
+    monkeypatch.setattr(parser, 'elasticsearch_client', lambda config: created.append(config) or object())
+    warm_sinks = serve.WarmSinks()
+    es = warm_sinks.client(config)
+    assert warm_sinks.client(copy.copy(config)) is es and len(created) == 1
+
+    other = copy.copy(config)
+    other.es_host = 'search.example.com'
+    assert warm_sinks.client(other) is not es
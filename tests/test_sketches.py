@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_sketches.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import random
+
+from awsdbrparser.sketches import HyperLogLog, ResourceStats, SpaceSaving
+
+
+def test_space_saving_is_exact_below_capacity():
+    summary = SpaceSaving(10)
+    for item, weight in [('a', 1.0), ('b', 5.0), ('a', 2.5), ('c', 0.5)]:
+        summary.add(item, weight)
+    assert summary.top(2) == [('b', 5.0, 0.0), ('a', 3.5, 0.0)]
+
+
+def test_space_saving_error_bound_holds_after_merge():
+    rng = random.Random(7)
+    exact = {}
+    halves = [SpaceSaving.for_error(0.01), SpaceSaving.for_error(0.01)]
+    for n in range(20000):
+        # a few heavy resources in a long tail of cheap ones
+        item = 'heavy-{}'.format(n % 5) if n % 4 == 0 else 'tail-{}'.format(rng.randint(0, 5000))
+        weight = rng.random()
+        exact[item] = exact.get(item, 0.0) + weight
+        halves[n % 2].add(item, weight)
+    summary, other = halves
+    summary.merge(other)
+
+    top = summary.top(5)
+    assert sorted(item for item, _, _ in top) == ['heavy-{}'.format(n) for n in range(5)]
+    for item, count, error in top:
+        assert count - error <= exact[item] + 1e-6 <= count + 1e-6
+        assert error <= summary.total / summary.capacity
+
+
+def test_hyperloglog_estimate_and_merge():
+    first, second = HyperLogLog.for_error(0.02), HyperLogLog.for_error(0.02)
+    for n in range(30000):
+        (first if n % 3 else second).add('i-{:x}'.format(n))
+        second.add('i-{:x}'.format(n % 1000))
+    first.merge(second)
+    assert abs(first.count() - 30000) < 30000 * 0.02 * 3
+
+    small = HyperLogLog.for_error(0.02)
+    for n in range(40):
+        small.add(str(n % 20))
+    assert small.count() == 20
+
+
+def test_resource_stats_round_trip_through_json():
+    stats = ResourceStats(2, 0.1, 0.05)
+    for n in range(50):
+        stats.add({'ResourceId': 'i-{}'.format(n % 7), 'UsageStartDate': '2016-03-0{} 00:00:00'.format(n % 2 + 1),
+                   'ProductName': 'EC2', 'Cost': str(n)})
+    loaded = ResourceStats.from_dict(json.loads(json.dumps(stats.to_dict())))
+    assert list(loaded.top_documents()) == list(stats.top_documents())
+    assert list(loaded.distinct_documents(days={'2016-03-02'})) == list(stats.distinct_documents(days={'2016-03-02'}))
+
+    loaded.add({'ResourceId': 'i-0', 'UsageStartDate': '2016-03-01 01:00:00', 'ProductName': 'EC2', 'Cost': '100'})
+    assert next(loaded.top_documents())['ResourceId'] == 'i-0'
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_startup.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Startup time guard: importing the CLI (what every ``dbrparser`` invocation
+pays, including ``--version`` and file output) must not load the
+Elasticsearch and AWS client libraries. Uses ``python -X importtime``.
+"""
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ('boto3', 'botocore', 'elasticsearch', 'requests_aws4auth', 'requests', 'pyarrow')
+
+# generous upper bound for the cumulative import time of the CLI, in microseconds
+CLI_IMPORT_BUDGET = 250000
+
+
+def import_times(module):
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+        stderr=subprocess.STDOUT).decode('utf-8')
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='requires python -X importtime')
+def test_cli_import_skips_elasticsearch_and_aws():
+    times = import_times('awsdbrparser.cli')
+    loaded = [name for name in times if name.split('.')[0] in HEAVY_MODULES]
+    assert loaded == []
+    assert times['awsdbrparser.cli'] < CLI_IMPORT_BUDGET
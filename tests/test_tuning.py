@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_tuning.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+
+import pytest
+
+from awsdbrparser import parser
+from awsdbrparser import sinks
+from awsdbrparser import tuning
+from awsdbrparser.config import OUTPUT_TO_ELASTICSEARCH, PROCESS_BY_BULK
+
+from .conftest import FakeCluster
+
+RESTORED = {'refresh_interval': '30s', 'number_of_replicas': '2'}
+
+
+def test_settings_are_restored_and_merged_after_the_load():
+    es = FakeCluster()
+    with tuning.bulk_load(es, ['billing', 'billing'], force_merge=True):
+        assert es.events == [('settings', 'billing', tuning.BULK_LOAD_SETTINGS)]
+    assert es.events[1:] == [('settings', 'billing', RESTORED), ('forcemerge', 'billing'), ('refresh', 'billing')]
+
+
+def test_settings_are_restored_on_interrupt_without_merging():
+    es = FakeCluster()
+    with pytest.raises(KeyboardInterrupt):
+        with tuning.bulk_load(es, ['billing', 'elasticity'], force_merge=True):
+            raise KeyboardInterrupt()
+    assert es.events[2:] == [('settings', 'elasticity', RESTORED), ('refresh', 'elasticity'),
+                             ('settings', 'billing', RESTORED), ('refresh', 'billing')]
+
+
+def test_concurrent_loads_share_the_original_settings():
+    es = FakeCluster()
+    with tuning.bulk_load(es, ['billing']):
+        with tuning.bulk_load(es, ['billing']):
+            pass
+        assert len(es.events) == 1
+    assert es.indices.settings['billing'] == {'index.refresh_interval': '30s', 'index.number_of_replicas': '2'}
+
+
+def test_slow_restores_do_not_block_the_loads_of_other_indices():
+    es = FakeCluster()
+    merging, tuned, waited = threading.Event(), threading.Event(), []
+
+    def forcemerge(index, max_num_segments, request_timeout):
+        merging.set()
+        waited.append(tuned.wait(5))
+    es.indices.forcemerge = forcemerge
+
+    def load():
+        with tuning.bulk_load(es, ['billing'], force_merge=True):
+            pass
+    thread = threading.Thread(target=load)
+    thread.start()
+    assert merging.wait(5)
+    with tuning.bulk_load(es, ['elasticity']):
+        tuned.set()
+    thread.join()
+    assert waited == [True]
+
+
+def test_parse_tunes_the_line_items_index(config, monkeypatch):
+    config.output_type = OUTPUT_TO_ELASTICSEARCH
+    config.process_mode = PROCESS_BY_BULK
+    config.es_bulk_load = True
+    es = FakeCluster()
+    monkeypatch.setattr(parser, 'elasticsearch_client', lambda config: es)
+
+    summary = parser.parse(config, sink=sinks.ElasticsearchBulkSink(es, config))
+    assert summary.added == 4
+    assert es.events == [('settings', 'billing', tuning.BULK_LOAD_SETTINGS), ('bulk',),
+                         ('settings', 'billing', RESTORED), ('refresh', 'billing')]
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# tests/test_writers.py
+#
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import gzip
+import json
+import os
+
+import pytest
+
+from awsdbrparser import writers
+from awsdbrparser.config import COMPRESSION_GZIP
+
+
+def read_lines(filename):
+    opener = gzip.open if filename.endswith('.gz') else open
+    with opener(filename, 'rb') as f:
+        return [json.loads(line.decode('utf-8')) for line in f]
+
+
+def test_single_file_gzip(tmpdir):
+    filename = str(tmpdir.join('out.json.gz'))
+    writer = writers.NDJSONWriter(filename, compression=COMPRESSION_GZIP, buffer_size=64)
+    for n in range(10):
+        writer.write({'n': n, 'name': u'ção'})
+    writer.close()
+    assert writer.filenames == [filename]
+    assert read_lines(filename) == [{'n': n, 'name': u'ção'} for n in range(10)]
+
+
+def test_single_file_gets_the_compression_extension(tmpdir):
+    filename = str(tmpdir.join('out.json'))
+    writer = writers.NDJSONWriter(filename, compression=COMPRESSION_GZIP)
+    writer.write({'n': 1})
+    writer.close()
+    assert writer.filenames == [filename + '.gz']
+    assert not os.path.exists(filename)
+    assert read_lines(filename + '.gz') == [{'n': 1}]
+
+
+def test_shards_by_rows(tmpdir):
+    path = str(tmpdir.join('out'))
+    writer = writers.NDJSONWriter(path, compression=COMPRESSION_GZIP, max_rows=4)
+    for n in range(10):
+        writer.write({'n': n})
+    writer.close()
+    assert [os.path.basename(f) for f in writer.filenames] == [
+        'part-00000.json.gz', 'part-00001.json.gz', 'part-00002.json.gz']
+    assert [len(read_lines(f)) for f in writer.filenames] == [4, 4, 2]
+
+
+def test_threaded_writer_preserves_order(tmpdir):
+    path = str(tmpdir.join('out'))
+    writer = writers.ThreadedWriter(writers.NDJSONWriter(path, max_bytes=100), batch_size=7)
+    for n in range(100):
+        writer.write({'n': n})
+    writer.close()
+    documents = [doc for f in writer.filenames for doc in read_lines(f)]
+    assert documents == [{'n': n} for n in range(100)]
+
+
+def test_partitioned_writer_reopens_evicted_partitions(tmpdir):
+    path = str(tmpdir.join('out'))
+    writer = writers.PartitionedWriter(path, 'LinkedAccountId', max_open=1)
+    for account in ('111', '222', '111', None):
+        writer.write({'UsageStartDate': '2016-03-01 01:00:00', 'LinkedAccountId': account})
+    writer.close()
+    relative = sorted(os.path.relpath(f, path) for f in writer.filenames)
+    assert relative == [
+        os.path.join('dt=2016-03-01', 'account=111', 'part-00000.json'),
+        os.path.join('dt=2016-03-01', 'account=111', 'part-00001.json'),
+        os.path.join('dt=2016-03-01', 'account=222', 'part-00000.json'),
+        os.path.join('dt=2016-03-01', 'account=__HIVE_DEFAULT_PARTITION__', 'part-00000.json'),
+    ]
+    assert writer.rows == 4
+
+
+def test_partitioned_writer_needs_an_open_partition(tmpdir):
+    with pytest.raises(ValueError):
+        writers.PartitionedWriter(str(tmpdir.join('out')), 'LinkedAccountId', max_open=0)